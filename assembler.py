@@ -1,8 +1,14 @@
 import re
 import os
 import sys
+import json
+import bisect
+import hashlib
+import itertools
 import optparse
 
+verbose = False
+
 symbols = {}
 
 instructions = []
@@ -32,9 +38,19 @@ class AssemblerRangeError(AssemblerError):
         return "Range error on line %d: %s" % (self.line, self.reason)
 
 
+class AssemblerLinkError(AssemblerError):
+    def __init__(self, module, reason):
+        self.module = module
+        self.reason = reason
+
+    def __str__(self):
+        return "Link error in %s: %s" % (self.module, self.reason)
+
+
 label_re = re.compile(r"""^(?P<labels>.*:)?(?P<gunk>[^:]*)$""")
 comment_re = re.compile(r"""^(?P<important>[^#]*)(?P<comment>#.*)?$""")
 valid_label_re = re.compile(r"""^\w+$""")
+include_re = re.compile(r"""^\.include\s+"(?P<path>[^"]+)"$""")
 
 rtype_0_re = re.compile(r"""^(?P<instr>(nop|halt))""")
 rtype_1_re = re.compile(
@@ -132,7 +148,9 @@ def validLabel(s):
     return valid_label_re.match(s) != None
 
 
-def fill_symbol_table(inputFile):
+def fill_symbol_table(inputFile, table=None, includes=None):
+    if table is None:
+        table = symbols
     lineNo = 1
     instructionsSeen = 0
     for line in inputFile:
@@ -161,12 +179,17 @@ def fill_symbol_table(inputFile):
         for label in labels:
             if not validLabel(label):
                 raise AssemblerSyntaxError(lineNo, "Invalid label: '%s'" % label)
-            if label in symbols:
+            if label in table:
                 raise AssemblerSyntaxError(lineNo, "Label %s already defined" % label)
-            symbols[label] = instructionsSeen
+            table[label] = instructionsSeen
 
         instruction = match.group("gunk").replace(",", " ").strip()
-        if len(instruction) != 0:
+        include = include_re.match(instruction)
+        if include:
+            if includes is None:
+                raise AssemblerSyntaxError(lineNo, ".include is only allowed in programs")
+            includes.append(include.group("path"))
+        elif len(instruction) != 0:
             # there's an instruction here, so increment the number of instructions
             instructionsSeen += 1
         lineNo += 1
@@ -190,7 +213,12 @@ def pprintInstr(separators, num):
     return binary
 
 
-def assemble_instructions(inputFile):
+def assemble_instructions(inputFile, table=None, relocations=None):
+    """Ensambla las instrucciones. Con `relocations` (una lista) los saltos
+    condicionales y los `j` se dejan en 0 y se anotan como (instrucción, tipo,
+    etiqueta, línea) para que los resuelva `link`."""
+    if table is None:
+        table = symbols
     lineNo = 1
     instructionsSeen = 0
     instructions = []
@@ -204,6 +232,9 @@ def assemble_instructions(inputFile):
 
         match = label_re.match(line)
 
+        if include_re.match(match.group("gunk").strip()):
+            lineNo += 1
+            continue
         instruction = match.group("gunk").lower().replace(",", " ").strip()
 
         rtype_0 = rtype_0_re.match(instruction)
@@ -325,10 +356,15 @@ def assemble_instructions(inputFile):
                 rs = int(itype_1.group("rs")[1:])
                 label = itype_1.group("label")
                 # find label
-                if label not in symbols:
+                if relocations is not None:
+                    # El desplazamiento se calcula al enlazar, donde se
+                    # conoce la posición final de la etiqueta
+                    relocations.append((instructionsSeen, "branch", label, lineNo))
+                    offset = 0
+                elif label in table:
+                    offset = table[label] - (instructionsSeen + 1)
+                else:
                     raise AssemblerSyntaxError(lineNo, "unknown label %s" % label)
-                instructionNo = symbols[label]
-                offset = instructionNo - (instructionsSeen + 1)
                 if offset > 2**15 - 1 or offset < -(2**15):
                     raise AssemblerRangeError(
                         lineNo,
@@ -349,10 +385,15 @@ def assemble_instructions(inputFile):
                 rt = int(branch.group("rt")[1:])
                 label = branch.group("label")
                 # find label
-                if label not in symbols:
+                if relocations is not None:
+                    # El desplazamiento se calcula al enlazar, donde se
+                    # conoce la posición final de la etiqueta
+                    relocations.append((instructionsSeen, "branch", label, lineNo))
+                    offset = 0
+                elif label in table:
+                    offset = table[label] - (instructionsSeen + 1)
+                else:
                     raise AssemblerSyntaxError(lineNo, "unknown label %s" % label)
-                instructionNo = symbols[label]
-                offset = instructionNo - (instructionsSeen + 1)
                 if offset > 2**15 - 1 or offset < -(2**15):
                     raise AssemblerRangeError(
                         lineNo,
@@ -391,9 +432,14 @@ def assemble_instructions(inputFile):
                 opcode = opcodes[instr]
                 # find label
                 label = jtype.group("label")
-                if label not in symbols:
+                if relocations is not None:
+                    # La dirección absoluta depende de dónde quede el módulo
+                    relocations.append((instructionsSeen, "j", label, lineNo))
+                    instructionNo = 0
+                elif label in table:
+                    instructionNo = table[label]
+                else:
                     raise AssemblerSyntaxError(lineNo, "unknown label %s" % label)
-                instructionNo = symbols[label]
                 num = opcode << 26 | (instructionNo & 67108863)
                 debug(
                     "{0:s} addr: {1:d} hex_code: {2:04x}\n{3:s}\n".format(
@@ -412,6 +458,234 @@ def assemble_instructions(inputFile):
     return instructions
 
 
+# Versión del formato de los archivos objeto; los de otra versión se vuelven
+# a ensamblar
+OBJECT_VERSION = 2
+
+# Salto condicional con la condición contraria (bltz no tiene)
+inverse_opcodes = {
+    opcodes["beq"]: opcodes["bne"],
+    opcodes["bne"]: opcodes["beq"],
+    opcodes["blez"]: opcodes["bgtz"],
+    opcodes["bgtz"]: opcodes["blez"],
+}
+
+
+def assemble_module(path, source):
+    """Ensambla un módulo como archivo objeto reubicable: un dict con el código,
+    las etiquetas que define, las reubicaciones pendientes y los módulos que
+    incluye (con el path ya resuelto)."""
+    lines = source.splitlines(True)
+    table = {}
+    includes = []
+    module_relocations = []
+    fill_symbol_table(lines, table, includes)
+    code = assemble_instructions(lines, table, module_relocations)
+    base = os.path.dirname(path)
+    return {
+        "version": OBJECT_VERSION,
+        "module": path,
+        "hash": hashlib.sha256(source.encode("utf-8")).hexdigest(),
+        "code": code,
+        "symbols": table,
+        "relocations": module_relocations,
+        "includes": [os.path.normpath(os.path.join(base, p)) for p in includes],
+    }
+
+
+def load_module(path, cache_dir=None):
+    """Devuelve el objeto de un módulo. Con `cache_dir` se guarda ahí y solo se
+    vuelve a ensamblar si cambió el contenido del .asm."""
+    with open(path) as inputFile:
+        source = inputFile.read()
+    if cache_dir is None:
+        return assemble_module(path, source)
+
+    digest = hashlib.sha256(source.encode("utf-8")).hexdigest()
+    name = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()[:16]
+    object_path = os.path.join(
+        cache_dir, "%s-%s.o.json" % (os.path.basename(path), name)
+    )
+    try:
+        with open(object_path) as objectFile:
+            module = json.load(objectFile)
+        if (
+            module.get("version") == OBJECT_VERSION
+            and module["hash"] == digest
+            and module["module"] == path
+        ):
+            debug("using cached object %s" % object_path)
+            return module
+    except (IOError, ValueError, KeyError):
+        pass
+
+    module = assemble_module(path, source)
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(object_path, "w") as objectFile:
+        json.dump(module, objectFile)
+    return module
+
+
+def load_program(path, cache_dir=None):
+    """Carga el módulo principal y, después, los que incluye (recursivamente y
+    una vez cada uno), en el orden en que se van a enlazar."""
+    modules = []
+    seen = set()
+    pending = [os.path.normpath(path)]
+    while pending:
+        module_path = pending.pop(0)
+        if module_path in seen:
+            continue
+        seen.add(module_path)
+        if not os.path.exists(module_path):
+            raise AssemblerLinkError(
+                modules[-1]["module"] if modules else module_path,
+                "included file %s not found" % module_path,
+            )
+        module = load_module(module_path, cache_dir)
+        modules.append(module)
+        pending.extend(module["includes"])
+    return modules
+
+
+def link(modules, symbols=None):
+    """Coloca los módulos uno detrás de otro y resuelve sus reubicaciones.
+
+    Los saltos condicionales que no llegan con 16 bits se relajan: beq/bne y
+    blez/bgtz pasan a la condición contraria saltando sobre un `j` al
+    destino; bltz, que no tiene contraria, usa `bltz +1; j siguiente; j
+    destino`. Cada expansión mueve las etiquetas posteriores, así que se
+    vuelven a revisar los saltos cortos que pasan por encima de ella hasta
+    que no haya más: las instrucciones solo crecen, por lo que termina.
+
+    Devuelve (instrucciones, cantidad de saltos expandidos). Si se da
+    `symbols` (un dict) se llena con la dirección final de cada etiqueta, en
+    instrucciones."""
+    table = {}
+    base = 0
+    code = []
+    for module in modules:
+        for label, index in module["symbols"].items():
+            if label in table:
+                raise AssemblerLinkError(
+                    module["module"],
+                    "label %s already defined in %s" % (label, table[label][1]),
+                )
+            table[label] = (base + index, module["module"])
+        base += len(module["code"])
+        code.extend(module["code"])
+
+    branches = {}  # instrucción -> (instrucción destino, línea, módulo, etiqueta)
+    jumps = {}
+    base = 0
+    for module in modules:
+        for index, kind, label, lineNo in module["relocations"]:
+            if label not in table:
+                raise AssemblerSyntaxError(
+                    lineNo, "unknown label %s (in %s)" % (label, module["module"])
+                )
+            entry = (table[label][0], lineNo, module["module"], label)
+            if kind == "j":
+                jumps[base + index] = entry
+            else:
+                branches[base + index] = entry
+        base += len(module["code"])
+
+    # Las expansiones solo agregan instrucciones, así que un salto que deja
+    # de llegar no vuelve a llegar. Se revisan todos una vez y después solo
+    # los que pasan por encima de una expansión nueva; las direcciones
+    # intermedias salen de un árbol de Fenwick con lo que creció cada
+    # instrucción.
+    sizes = [1] * len(code)
+    growth = [0] * (len(code) + 1)
+
+    def grow(index, amount):
+        index += 1
+        while index < len(growth):
+            growth[index] += amount
+            index += index & -index
+
+    def address_of(index):
+        total = index
+        while index > 0:
+            total += growth[index]
+            index -= index & -index
+        return total
+
+    def span(index):
+        target = branches[index][0]
+        return min(index + 1, target), max(index + 1, target)
+
+    short = set(branches)
+    ordered = sorted(branches)
+    pending = list(ordered)
+    queued = set(pending)
+    while pending:
+        index = pending.pop()
+        queued.discard(index)
+        if fits_offset(address_of(branches[index][0]) - (address_of(index) + 1)):
+            continue
+        short.discard(index)
+        sizes[index] = 3 if code[index] >> 26 not in inverse_opcodes else 2
+        grow(index, sizes[index] - 1)
+        # Un salto corto mide como mucho 2**15 instrucciones, así que solo
+        # los cercanos pueden pasar por encima de esta expansión
+        first = bisect.bisect_left(ordered, index - 2**15 - 1)
+        last = bisect.bisect_right(ordered, index + 2**15 + 1)
+        for other in ordered[first:last]:
+            if other in short and other not in queued:
+                low, high = span(other)
+                if low <= index < high:
+                    queued.add(other)
+                    pending.append(other)
+    address = list(itertools.accumulate(sizes, initial=0))
+
+    instructions = []
+    for index, num in enumerate(code):
+        if index in jumps:
+            target, lineNo, module, label = jumps[index]
+            instructions.append(jump(address[target], lineNo, module, label))
+        elif index in branches:
+            target, lineNo, module, label = branches[index]
+            num &= ~65535
+            if index in short:
+                offset = address[target] - (address[index] + 1)
+                instructions.append(num | (offset & 65535))
+            elif code[index] >> 26 in inverse_opcodes:
+                inverse = inverse_opcodes[code[index] >> 26]
+                instructions.append((num & 67108863) | inverse << 26 | 1)
+                instructions.append(jump(address[target], lineNo, module, label))
+            else:
+                instructions.append(num | 1)
+                instructions.append(jump(address[index] + 3, lineNo, module, label))
+                instructions.append(jump(address[target], lineNo, module, label))
+        else:
+            instructions.append(num)
+    if symbols is not None:
+        for label, (index, _) in table.items():
+            symbols[label] = address[index]
+    return instructions, len(branches) - len(short)
+
+
+def fits_offset(offset):
+    return -(2**15) <= offset <= 2**15 - 1
+
+
+def jump(target, lineNo, module, label):
+    """Codifica un `j`; el destino tiene que caber en 26 bits."""
+    if target > 67108863:
+        raise AssemblerRangeError(
+            lineNo,
+            "label %s is too far away: address %d does not fit in 26 bits (in %s)"
+            % (label, target, module),
+        )
+    return opcodes["j"] << 26 | target
+
+
+def assemble_program(path, cache_dir=None):
+    return link(load_program(path, cache_dir))
+
+
 def print_instructions(instructions, outputdir):
 
     hex_instructions = [("%04x" % inst).zfill(8) for inst in instructions]
@@ -462,6 +736,14 @@ if __name__ == "__main__":
         default=False,
         help="Verbose debug mode",
     )
+    parser.add_option(
+        "-c",
+        "--cache",
+        dest="cache",
+        type="string",
+        default=None,
+        help="Folder to keep the object file of each module, reassembling only the modules that changed.",
+    )
     options, args = parser.parse_args()
     if len(args) != 1:
         parser.error("Incorrect command line arguments")
@@ -474,22 +756,19 @@ if __name__ == "__main__":
     # if re.match(r""".*(?P<extension>\.s)$""",input_file,re.I) and output_file == 'a.hex':
     # output_file = input_file[:-1] + "hex"
 
-    try:
-        infile = open(input_file)
-    except IOError as e:
-        print >> sys.stderr, "Unable to open input file %s" % input_file
+    if not os.path.exists(input_file):
+        print("Unable to open input file %s" % input_file, file=sys.stderr)
         sys.exit(1)
     try:
-        fill_symbol_table(infile)
-        infile.seek(0)
-        instructions = assemble_instructions(infile)
-        infile.close()
+        instructions, expanded = assemble_program(input_file, options.cache)
+        if expanded:
+            print("%d out-of-range branches expanded to a long form" % expanded)
     except AssemblerError as e:
-        print >> sys.stderr, str(e)
+        print(str(e), file=sys.stderr)
         sys.exit(1)
     try:
         print_instructions(instructions, output_folder)
     except IOError as e:
-        print >> sys.stderr, "Unable to write to output file %s" % output_file
+        print("Unable to write to output folder %s" % output_folder, file=sys.stderr)
         sys.exit(1)
     sys.exit(0)
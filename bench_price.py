@@ -0,0 +1,295 @@
+"""Benchmark de price.py sobre s-mips.circ y sobre un diseño sintético con
+cientos de subcircuitos repartidos en varias librerías. También compara el
+tiempo de carga y el pico de memoria del cargador por iterparse contra
+ET.parse sobre s-mips.circ y sobre un .circ sintético grande.
+
+Uso: python bench_price.py [-f FILES] [-c CIRCUITS] [-r REPEAT] [-m MB]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+import price
+
+BUILTIN_LIBS = """  <lib desc="#Wiring" name="0"/>
+  <lib desc="#Gates" name="1"/>
+  <lib desc="#Plexers" name="2"/>
+  <lib desc="#Arithmetic" name="3"/>
+  <lib desc="#Memory" name="4"/>
+  <lib desc="#I/O" name="5"/>
+  <lib desc="#Base" name="6"/>
+"""
+
+PARTS = [
+    ("1", "AND Gate", {"width": "8", "inputs": "2"}),
+    ("1", "OR Gate", {"inputs": "3"}),
+    ("1", "NOT Gate", {"width": "4"}),
+    ("1", "XOR Gate", {"width": "16", "inputs": "2"}),
+    ("2", "Multiplexer", {"width": "32", "select": "2"}),
+    ("3", "Adder", {"width": "32"}),
+    ("3", "Comparator", {"width": "16"}),
+    ("4", "Register", {"width": "32"}),
+    ("0", "Splitter", {"fanout": "4", "incoming": "32"}),
+    ("0", "Tunnel", {"label": "x", "width": "32"}),
+]
+
+
+def circuit_name(file_index, index):
+    return "C{}_{}".format(file_index, index)
+
+
+def make_synthetic_design(directory, files=10, circuits=50, comps=40, subs=4, seed=0):
+    """Genera un diseño con `files` librerías de `circuits` subcircuitos cada
+    una. Cada subcircuito tiene `comps` componentes simples, otros tantos
+    cables y hasta `subs` instancias de subcircuitos de librerías posteriores
+    (el grafo es acíclico). Devuelve el .circ principal y su circuito raíz."""
+    rng = random.Random(seed)
+    for f in range(files):
+        libs = "".join(
+            '  <lib desc="file#lib{}.circ" name="{}"/>\n'.format(g, 7 + g - f - 1)
+            for g in range(f + 1, files)
+        )
+        with open(os.path.join(directory, "lib{}.circ".format(f)), "w") as out:
+            out.write('<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n')
+            out.write('<project source="2.7.1" version="1.0">\n')
+            out.write(BUILTIN_LIBS + libs)
+            for c in range(circuits):
+                out.write('  <circuit name="{}">\n'.format(circuit_name(f, c)))
+                for i in range(comps):
+                    out.write(
+                        '    <wire from="({0},{1})" to="({2},{1})"/>\n'.format(
+                            10 * i, 10 * c, 10 * i + 30
+                        )
+                    )
+                for i in range(comps):
+                    lib, name, attrs = rng.choice(PARTS)
+                    out.write(
+                        '    <comp lib="{}" loc="({},{})" name="{}">\n'.format(
+                            lib, 10 * i, 10 * c, name
+                        )
+                    )
+                    for key, val in attrs.items():
+                        out.write('      <a name="{}" val="{}"/>\n'.format(key, val))
+                    out.write("    </comp>\n")
+                for i in range(subs):
+                    if c + 1 < circuits and rng.random() < 0.5:
+                        out.write(
+                            '    <comp loc="({},{})" name="{}"/>\n'.format(
+                                10 * i, 500, circuit_name(f, rng.randrange(c + 1, circuits))
+                            )
+                        )
+                    elif f + 1 < files:
+                        g = rng.randrange(f + 1, files)
+                        out.write(
+                            '    <comp lib="{}" loc="({},{})" name="{}"/>\n'.format(
+                                7 + g - f - 1, 10 * i, 600, circuit_name(g, rng.randrange(circuits))
+                            )
+                        )
+                out.write("  </circuit>\n")
+            out.write("</project>\n")
+
+    main = os.path.join(directory, "main.circ")
+    with open(main, "w") as out:
+        out.write('<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n')
+        out.write('<project source="2.7.1" version="1.0">\n')
+        out.write(BUILTIN_LIBS)
+        out.write('  <lib desc="file#lib0.circ" name="7"/>\n')
+        out.write('  <circuit name="Top">\n')
+        for c in range(circuits):
+            out.write(
+                '    <comp lib="7" loc="(0,{})" name="{}"/>\n'.format(
+                    10 * c, circuit_name(0, c)
+                )
+            )
+        out.write("  </circuit>\n")
+        out.write("</project>\n")
+    return main, "Top"
+
+
+APPEAR = """    <appear>
+      <rect fill="none" height="80" stroke="#000000" stroke-width="2" width="100" x="50" y="40"/>
+      <text font-family="SansSerif" font-size="12" text-anchor="middle" x="100" y="85">{name}</text>
+      <circ-port height="8" pin="50,80" width="8" x="46" y="56"/>
+      <circ-port height="10" pin="490,210" width="10" x="145" y="75"/>
+      <circ-anchor facing="east" height="6" width="6" x="147" y="77"/>
+    </appear>
+"""
+
+
+def make_deep_design(path, depth, cells=32):
+    """Genera una jerarquía de `depth` envoltorios anidados, cada uno con
+    `cells` celdas de un registro de 1 bit y el envoltorio siguiente."""
+    with open(path, "w") as out:
+        out.write('<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n')
+        out.write('<project source="2.7.1" version="1.0">\n')
+        out.write(BUILTIN_LIBS)
+        out.write('  <circuit name="Cell">\n')
+        out.write('    <comp lib="4" loc="(100,100)" name="Register">\n')
+        out.write('      <a name="width" val="1"/>\n    </comp>\n  </circuit>\n')
+        for level in range(depth):
+            out.write('  <circuit name="W{}">\n'.format(level))
+            for i in range(cells):
+                out.write('    <comp loc="({},100)" name="Cell"/>\n'.format(10 * i))
+            if level + 1 < depth:
+                out.write('    <comp loc="(0,500)" name="W{}"/>\n'.format(level + 1))
+            out.write("  </circuit>\n")
+        out.write("</project>\n")
+    return path, "W0"
+
+
+def make_large_circ(path, megabytes):
+    """Genera un único .circ de aproximadamente `megabytes` MB, con
+    apariencias, etiquetas y fuentes como los que guarda Logisim."""
+    rng = random.Random(0)
+    limit = megabytes * 1024 * 1024
+    with open(path, "w") as out:
+        out.write('<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n')
+        out.write('<project source="2.7.1" version="1.0">\n')
+        out.write(BUILTIN_LIBS)
+        c = 0
+        while out.tell() < limit:
+            name = "Big{}".format(c)
+            out.write('  <circuit name="{}">\n'.format(name))
+            out.write('    <a name="circuit" val="{}"/>\n'.format(name))
+            out.write(APPEAR.format(name=name))
+            for i in range(200):
+                out.write(
+                    '    <wire from="({0},{1})" to="({2},{1})"/>\n'.format(
+                        10 * i, 10 * c, 10 * i + 30
+                    )
+                )
+                lib, part, attrs = rng.choice(PARTS)
+                out.write(
+                    '    <comp lib="{}" loc="({},{})" name="{}">\n'.format(
+                        lib, 10 * i, 10 * c, part
+                    )
+                )
+                for key, val in attrs.items():
+                    out.write('      <a name="{}" val="{}"/>\n'.format(key, val))
+                out.write('      <a name="facing" val="west"/>\n')
+                out.write('      <a name="label" val="{}_{}"/>\n'.format(part, i))
+                out.write('      <a name="labelfont" val="SansSerif plain 12"/>\n')
+                out.write("    </comp>\n")
+            out.write("  </circuit>\n")
+            c += 1
+        out.write("</project>\n")
+
+
+def measure_load(loader, path):
+    """Tiempo de carga y pico de memoria (tracemalloc) de `loader(path)`,
+    manteniendo vivo el resultado como lo hace price.py."""
+    start = time.perf_counter()
+    loader(path)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    result = loader(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return elapsed, peak
+
+
+def compare_loaders(label, path):
+    size = os.path.getsize(path) / (1024 * 1024)
+    for name, loader in (
+        ("ET.parse", lambda p: ET.parse(p).getroot()),
+        ("iterparse", price.load_document),
+    ):
+        elapsed, peak = measure_load(loader, path)
+        print(
+            "{:<20} {:7.1f} MB  {:<10} {:8.3f}s  pico {:8.1f} MB".format(
+                label, size, name, elapsed, peak / (1024 * 1024)
+            )
+        )
+
+
+def time_bill(file, circuit, repeat, jobs=1):
+    best = None
+    for _ in range(repeat):
+        # Se mide en frío: sin los documentos parseados por la repetición anterior
+        price.clear_cache()
+        start = time.perf_counter()
+        bill = price.Pricer(jobs=jobs).bill(file, circuit)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, bill[circuit]["price"], len(bill)
+
+
+def time_incremental(file, circuit, directory, edited):
+    """Tiempo de calcular el precio con DiskCache: en frío, sin cambios y
+    después de editar la librería `edited`."""
+    cache_dir = os.path.join(directory, "cache")
+    times = []
+    for step in ("frío", "sin cambios", "tras editar"):
+        if step == "tras editar":
+            with open(edited, "a") as out:
+                out.write("\n")
+        price.clear_cache()
+        start = time.perf_counter()
+        price.Pricer(cache=price.DiskCache(cache_dir)).bill(file, circuit)
+        times.append((step, time.perf_counter() - start))
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-f", "--files", type=int, default=10, help="Library files.")
+    parser.add_argument(
+        "-c", "--circuits", type=int, default=50, help="Subcircuits per library."
+    )
+    parser.add_argument("-r", "--repeat", type=int, default=3)
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Processes used to parse the libraries in the parallel run.",
+    )
+    parser.add_argument(
+        "-m",
+        "--megabytes",
+        type=int,
+        default=50,
+        help="Size of the large design used to compare loaders (0 to skip).",
+    )
+    args = parser.parse_args()
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    cases = [("s-mips.circ", os.path.join(here, "s-mips.circ"), "S-MIPS")]
+    with tempfile.TemporaryDirectory() as directory:
+        main_file, top = make_synthetic_design(directory, args.files, args.circuits)
+        cases.append(
+            ("sintético {}x{}".format(args.files, args.circuits), main_file, top)
+        )
+        for depth in (500, 2000):
+            deep = make_deep_design(os.path.join(directory, "deep{}.circ".format(depth)), depth)
+            cases.append(("profundidad {}".format(depth),) + deep)
+        for label, file, circuit in cases:
+            for jobs in sorted({1, args.jobs}):
+                elapsed, total, circuits = time_bill(file, circuit, args.repeat, jobs)
+                print(
+                    "{:<20} {:>5} circuitos  precio {:>12}  -j {:<3} {:8.3f}s".format(
+                        label, circuits, total, jobs, elapsed
+                    )
+                )
+
+        print()
+        edited = os.path.join(directory, "lib{}.circ".format(args.files - 1))
+        for step, elapsed in time_incremental(main_file, top, directory, edited):
+            print("DiskCache {:<20} {:8.3f}s".format(step, elapsed))
+
+        print()
+        compare_loaders("s-mips.circ", cases[0][1])
+        if args.megabytes > 0:
+            large = os.path.join(directory, "large.circ")
+            make_large_circ(large, args.megabytes)
+            compare_loaders("sintético", large)
+
+
+if __name__ == "__main__":
+    main()
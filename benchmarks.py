@@ -0,0 +1,440 @@
+"""Kernels de rendimiento del S-MIPS generados a partir de plantillas.
+
+Cada kernel recibe un tamaño `n` y produce un .asm que termina escribiendo en
+la TTY un número de comprobación (en decimal). La salida esperada se calcula
+con un modelo en Python del kernel y se contrasta con el simulador de
+referencia, que además cuenta las instrucciones ejecutadas para fijar el
+`#limit`. La línea `#elements` indica cuántos elementos procesa el kernel, y
+`test.py --benchmark` la usa para reportar ticks por elemento.
+
+Uso: python benchmarks.py -o benchmarks [-k sort,fib] [-s 8,16,32] [-t 8]
+"""
+
+import argparse
+import os
+from collections import namedtuple
+
+import assembler
+import simulator
+
+MASK = simulator.MASK
+
+# Los datos se guardan desde esta dirección (en bytes), lejos del programa y
+# al alcance del inmediato de 16 bits de addi
+DATA = 0x4000
+DATA_END = 0x8000
+
+# Ticks de reloj por instrucción que se permiten en el #limit: holgado para
+# una implementación multiciclo. Es una suposición sin calibrar contra
+# Logisim; el README explica cómo ajustarla con -t
+TICKS_PER_INSTRUCTION = 8
+
+Kernel = namedtuple("Kernel", "source expected elements")
+
+# Escribe r2 en decimal (sin signo) guardando los dígitos en la pila
+PRINT = """
+print:
+addi r5 r0 10
+addi r9 r0 0
+digits:
+divu r2 r5
+mfhi r6
+push r6
+addi r9 r9 1
+mflo r2
+bne r2 r0 digits
+emit:
+pop r6
+addi r6 r6 48
+tty r6
+addi r9 r9 -1
+bne r9 r0 emit
+halt
+"""
+
+SORT = """# Ordena {n} números pseudoaleatorios por inserción y escribe
+# la suma de a[i] * (i + 1)
+addi r20 r0 {data}
+addi r21 r0 {n}
+addi r3 r0 1
+addi r10 r0 171
+addi r11 r0 30269
+add r12 r20 r0
+addi r13 r0 0
+fill:
+mulu r3 r10
+mflo r3
+divu r3 r11
+mfhi r3
+sw r3 0(r12)
+addi r12 r12 4
+addi r13 r13 1
+bne r13 r21 fill
+
+addi r13 r0 1
+outer:
+beq r13 r21 sorted
+add r14 r13 r13
+add r14 r14 r14
+add r14 r14 r20
+lw r15 0(r14)
+inner:
+beq r14 r20 place
+lw r16 -4(r14)
+slt r17 r15 r16
+beq r17 r0 place
+sw r16 0(r14)
+addi r14 r14 -4
+j inner
+place:
+sw r15 0(r14)
+addi r13 r13 1
+j outer
+
+sorted:
+addi r2 r0 0
+addi r13 r0 0
+add r12 r20 r0
+sum:
+lw r16 0(r12)
+addi r13 r13 1
+mulu r16 r13
+mflo r16
+add r2 r2 r16
+addi r12 r12 4
+bne r13 r21 sum
+"""
+
+SIEVE = """# Criba de Eratóstenes: escribe la cantidad de primos hasta {n}
+addi r20 r0 {data}
+addi r21 r0 {n}
+addi r7 r21 1
+add r12 r20 r0
+addi r13 r0 0
+clear:
+sw r0 0(r12)
+addi r12 r12 4
+addi r13 r13 1
+bne r13 r7 clear
+
+addi r22 r0 1
+addi r2 r0 0
+addi r13 r0 2
+outer:
+slt r6 r21 r13
+bne r6 r0 done
+add r14 r13 r13
+add r14 r14 r14
+add r14 r14 r20
+lw r15 0(r14)
+bne r15 r0 next
+addi r2 r2 1
+mult r13 r13
+mflo r16
+mark:
+slt r6 r21 r16
+bne r6 r0 next
+add r17 r16 r16
+add r17 r17 r17
+add r17 r17 r20
+sw r22 0(r17)
+add r16 r16 r13
+j mark
+next:
+addi r13 r13 1
+j outer
+done:
+"""
+
+MATMUL = """# Producto de matrices {n}x{n} con A[i][j] = i - j y B[i][j] = i + j + 1;
+# escribe el hash c = c * 31 + C[i][j] recorriendo C por filas
+addi r20 r0 {a}
+addi r22 r0 {b}
+addi r23 r0 {c}
+addi r21 r0 {n}
+addi r13 r0 0
+add r12 r20 r0
+add r18 r22 r0
+fi:
+addi r14 r0 0
+fj:
+sub r6 r13 r14
+sw r6 0(r12)
+add r6 r13 r14
+addi r6 r6 1
+sw r6 0(r18)
+addi r12 r12 4
+addi r18 r18 4
+addi r14 r14 1
+bne r14 r21 fj
+addi r13 r13 1
+bne r13 r21 fi
+
+add r24 r21 r21
+add r24 r24 r24
+addi r26 r0 31
+addi r2 r0 0
+addi r13 r0 0
+add r12 r20 r0
+add r19 r23 r0
+mi:
+addi r14 r0 0
+mj:
+addi r7 r0 0
+add r8 r12 r0
+add r25 r14 r14
+add r25 r25 r25
+add r25 r25 r22
+addi r15 r0 0
+mk:
+lw r16 0(r8)
+lw r17 0(r25)
+mult r16 r17
+mflo r16
+add r7 r7 r16
+addi r8 r8 4
+add r25 r25 r24
+addi r15 r15 1
+bne r15 r21 mk
+sw r7 0(r19)
+mulu r2 r26
+mflo r2
+add r2 r2 r7
+addi r19 r19 4
+addi r14 r14 1
+bne r14 r21 mj
+add r12 r12 r24
+addi r13 r13 1
+bne r13 r21 mi
+"""
+
+MEMCPY = """# Copia {n} palabras con lw/sw y escribe el hash h = h * 31 + dst[i]
+addi r20 r0 {src}
+addi r22 r0 {dst}
+addi r21 r0 {n}
+add r12 r20 r0
+addi r13 r0 0
+addi r6 r0 3
+fill:
+sw r6 0(r12)
+addi r6 r6 7
+addi r12 r12 4
+addi r13 r13 1
+bne r13 r21 fill
+
+add r12 r20 r0
+add r18 r22 r0
+addi r13 r0 0
+copy:
+lw r6 0(r12)
+sw r6 0(r18)
+addi r12 r12 4
+addi r18 r18 4
+addi r13 r13 1
+bne r13 r21 copy
+
+addi r26 r0 31
+addi r2 r0 0
+add r18 r22 r0
+addi r13 r0 0
+hash:
+lw r6 0(r18)
+mulu r2 r26
+mflo r2
+add r2 r2 r6
+addi r18 r18 4
+addi r13 r13 1
+bne r13 r21 hash
+"""
+
+# Sin instrucción de llamada, cada llamada deja en la pila una marca de a
+# dónde volver y `ret` la despacha
+FIB = """# fib({n}) recursivo: en r4 el argumento, en r2 el resultado; cada
+# llamada apila sus datos y una marca de retorno (0 fin, 1 y 2 las dos
+# llamadas recursivas)
+addi r4 r0 {n}
+addi r5 r0 0
+push r5
+fib:
+slti r6 r4 2
+beq r6 r0 recurse
+add r2 r4 r0
+j ret
+recurse:
+push r4
+addi r5 r0 1
+push r5
+addi r4 r4 -1
+j fib
+after1:
+pop r4
+push r2
+addi r5 r0 2
+push r5
+addi r4 r4 -2
+j fib
+after2:
+pop r7
+add r2 r2 r7
+ret:
+pop r5
+beq r5 r0 print
+addi r6 r0 1
+beq r5 r6 after1
+j after2
+"""
+
+
+def check_data(name, n, end):
+    if n < 1 or end > DATA_END:
+        raise ValueError("Size {} is out of range for kernel {}".format(n, name))
+
+
+def lcg(n):
+    x = 1
+    for _ in range(n):
+        x = x * 171 % 30269
+        yield x
+
+
+def sort_kernel(n):
+    check_data("sort", n, DATA + 4 * n)
+    values = sorted(lcg(n))
+    expected = sum(v * (i + 1) for i, v in enumerate(values)) & MASK
+    return Kernel(SORT.format(n=n, data=DATA), expected, n)
+
+
+def sieve_kernel(n):
+    check_data("sieve", n, DATA + 4 * (n + 1))
+    composite = [False] * (n + 1)
+    primes = 0
+    for i in range(2, n + 1):
+        if not composite[i]:
+            primes += 1
+            for j in range(i * i, n + 1, i):
+                composite[j] = True
+    return Kernel(SIEVE.format(n=n, data=DATA), primes, n)
+
+
+def matmul_kernel(n):
+    size = 4 * n * n
+    check_data("matmul", n, DATA + 3 * size)
+    h = 0
+    for i in range(n):
+        for j in range(n):
+            c = sum((i - k) * (k + j + 1) for k in range(n))
+            h = (h * 31 + c) & MASK
+    source = MATMUL.format(n=n, a=DATA, b=DATA + size, c=DATA + 2 * size)
+    return Kernel(source, h, n * n * n)
+
+
+def memcpy_kernel(n):
+    check_data("memcpy", n, DATA + 8 * n)
+    h = 0
+    for i in range(n):
+        h = (h * 31 + 3 + 7 * i) & MASK
+    return Kernel(MEMCPY.format(n=n, src=DATA, dst=DATA + 4 * n), h, n)
+
+
+def fib_kernel(n):
+    if n < 0 or n > 24:
+        raise ValueError("Size {} is out of range for kernel fib".format(n))
+    value, calls = [0, 1], [1, 1]
+    for i in range(2, n + 1):
+        value.append(value[i - 1] + value[i - 2])
+        calls.append(1 + calls[i - 1] + calls[i - 2])
+    return Kernel(FIB.format(n=n), value[n], calls[n])
+
+
+KERNELS = {
+    "sort": sort_kernel,
+    "sieve": sieve_kernel,
+    "matmul": matmul_kernel,
+    "memcpy": memcpy_kernel,
+    "fib": fib_kernel,
+}
+
+DEFAULT_SIZES = {
+    "sort": [8, 16, 32],
+    "sieve": [32, 64, 128],
+    "matmul": [2, 4, 8],
+    "memcpy": [16, 64, 256],
+    "fib": [6, 9, 12],
+}
+
+
+def render(name, n, ticks_per_instruction=TICKS_PER_INSTRUCTION):
+    """Texto del .asm del kernel `name` de tamaño `n`. Lo ensambla y ejecuta
+    en el simulador para comprobar la salida y medir las instrucciones."""
+    kernel = KERNELS[name](n)
+    source = kernel.source + PRINT
+    program, _ = assembler.link([assembler.assemble_module(name, source)])
+    machine = simulator.Machine(program)
+    output = machine.run()
+    if output != str(kernel.expected):
+        raise AssertionError(
+            "Kernel {} ({}) prints {} instead of {}".format(name, n, output, kernel.expected)
+        )
+    return "{}\n#prints {}\n#limit {}\n#elements {}\n".format(
+        source, kernel.expected, machine.steps * ticks_per_instruction, kernel.elements
+    )
+
+
+def write_kernels(directory, sizes, ticks_per_instruction=TICKS_PER_INSTRUCTION):
+    """Escribe `<kernel>-<n>.asm` por cada tamaño de `sizes` ({kernel:
+    [n...]}) y devuelve los paths."""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for name, ns in sizes.items():
+        for n in ns:
+            path = os.path.join(directory, "{}-{}.asm".format(name, n))
+            with open(path, "w") as file:
+                file.write(render(name, n, ticks_per_instruction))
+            paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-o", "--out", default="benchmarks", help="Folder for the generated .asm files."
+    )
+    parser.add_argument(
+        "-k",
+        "--kernels",
+        default=",".join(KERNELS),
+        help="Comma separated kernels to generate (default: all).",
+    )
+    parser.add_argument(
+        "-s",
+        "--sizes",
+        default=None,
+        help="Comma separated sizes for every kernel (default: the sizes of each kernel).",
+    )
+    parser.add_argument(
+        "-t",
+        "--ticks-per-instruction",
+        type=int,
+        default=TICKS_PER_INSTRUCTION,
+        help="Clock ticks allowed per executed instruction in #limit.",
+    )
+    args = parser.parse_args()
+
+    sizes = {}
+    for name in args.kernels.split(","):
+        if name not in KERNELS:
+            parser.error("Unknown kernel {}".format(name))
+        if args.sizes is None:
+            sizes[name] = DEFAULT_SIZES[name]
+        else:
+            sizes[name] = [int(n) for n in args.sizes.split(",")]
+    try:
+        paths = write_kernels(args.out, sizes, args.ticks_per_instruction)
+    except ValueError as e:
+        parser.error(str(e))
+    for path in paths:
+        print(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# fib(6) recursivo: en r4 el argumento, en r2 el resultado; cada
+# llamada apila sus datos y una marca de retorno (0 fin, 1 y 2 las dos
+# llamadas recursivas)
+addi r4 r0 6
+addi r5 r0 0
+push r5
+fib:
+slti r6 r4 2
+beq r6 r0 recurse
+add r2 r4 r0
+j ret
+recurse:
+push r4
+addi r5 r0 1
+push r5
+addi r4 r4 -1
+j fib
+after1:
+pop r4
+push r2
+addi r5 r0 2
+push r5
+addi r4 r4 -2
+j fib
+after2:
+pop r7
+add r2 r2 r7
+ret:
+pop r5
+beq r5 r0 print
+addi r6 r0 1
+beq r5 r6 after1
+j after2
+
+print:
+addi r5 r0 10
+addi r9 r0 0
+digits:
+divu r2 r5
+mfhi r6
+push r6
+addi r9 r9 1
+mflo r2
+bne r2 r0 digits
+emit:
+pop r6
+addi r6 r6 48
+tty r6
+addi r9 r9 -1
+bne r9 r0 emit
+halt
+
+#prints 8
+#limit 2872
+#elements 25
@@ -0,0 +1,82 @@
+# Producto de matrices 4x4 con A[i][j] = i - j y B[i][j] = i + j + 1;
+# escribe el hash c = c * 31 + C[i][j] recorriendo C por filas
+addi r20 r0 16384
+addi r22 r0 16448
+addi r23 r0 16512
+addi r21 r0 4
+addi r13 r0 0
+add r12 r20 r0
+add r18 r22 r0
+fi:
+addi r14 r0 0
+fj:
+sub r6 r13 r14
+sw r6 0(r12)
+add r6 r13 r14
+addi r6 r6 1
+sw r6 0(r18)
+addi r12 r12 4
+addi r18 r18 4
+addi r14 r14 1
+bne r14 r21 fj
+addi r13 r13 1
+bne r13 r21 fi
+
+add r24 r21 r21
+add r24 r24 r24
+addi r26 r0 31
+addi r2 r0 0
+addi r13 r0 0
+add r12 r20 r0
+add r19 r23 r0
+mi:
+addi r14 r0 0
+mj:
+addi r7 r0 0
+add r8 r12 r0
+add r25 r14 r14
+add r25 r25 r25
+add r25 r25 r22
+addi r15 r0 0
+mk:
+lw r16 0(r8)
+lw r17 0(r25)
+mult r16 r17
+mflo r16
+add r7 r7 r16
+addi r8 r8 4
+add r25 r25 r24
+addi r15 r15 1
+bne r15 r21 mk
+sw r7 0(r19)
+mulu r2 r26
+mflo r2
+add r2 r2 r7
+addi r19 r19 4
+addi r14 r14 1
+bne r14 r21 mj
+add r12 r12 r24
+addi r13 r13 1
+bne r13 r21 mi
+
+print:
+addi r5 r0 10
+addi r9 r0 0
+digits:
+divu r2 r5
+mfhi r6
+push r6
+addi r9 r9 1
+mflo r2
+bne r2 r0 digits
+emit:
+pop r6
+addi r6 r6 48
+tty r6
+addi r9 r9 -1
+bne r9 r0 emit
+halt
+
+#prints 640347904
+#limit 8576
+#elements 64
@@ -0,0 +1,59 @@
+# Copia 64 palabras con lw/sw y escribe el hash h = h * 31 + dst[i]
+addi r20 r0 16384
+addi r22 r0 16640
+addi r21 r0 64
+add r12 r20 r0
+addi r13 r0 0
+addi r6 r0 3
+fill:
+sw r6 0(r12)
+addi r6 r6 7
+addi r12 r12 4
+addi r13 r13 1
+bne r13 r21 fill
+
+add r12 r20 r0
+add r18 r22 r0
+addi r13 r0 0
+copy:
+lw r6 0(r12)
+sw r6 0(r18)
+addi r12 r12 4
+addi r18 r18 4
+addi r13 r13 1
+bne r13 r21 copy
+
+addi r26 r0 31
+addi r2 r0 0
+add r18 r22 r0
+addi r13 r0 0
+hash:
+lw r6 0(r18)
+mulu r2 r26
+mflo r2
+add r2 r2 r6
+addi r18 r18 4
+addi r13 r13 1
+bne r13 r21 hash
+
+print:
+addi r5 r0 10
+addi r9 r0 0
+digits:
+divu r2 r5
+mfhi r6
+push r6
+addi r9 r9 1
+mflo r2
+bne r2 r0 digits
+emit:
+pop r6
+addi r6 r6 48
+tty r6
+addi r9 r9 -1
+bne r9 r0 emit
+halt
+
+#prints 3213872352
+#limit 10224
+#elements 64
@@ -0,0 +1,61 @@
+# Criba de Eratóstenes: escribe la cantidad de primos hasta 128
+addi r20 r0 16384
+addi r21 r0 128
+addi r7 r21 1
+add r12 r20 r0
+addi r13 r0 0
+clear:
+sw r0 0(r12)
+addi r12 r12 4
+addi r13 r13 1
+bne r13 r7 clear
+
+addi r22 r0 1
+addi r2 r0 0
+addi r13 r0 2
+outer:
+slt r6 r21 r13
+bne r6 r0 done
+add r14 r13 r13
+add r14 r14 r14
+add r14 r14 r20
+lw r15 0(r14)
+bne r15 r0 next
+addi r2 r2 1
+mult r13 r13
+mflo r16
+mark:
+slt r6 r21 r16
+bne r6 r0 next
+add r17 r16 r16
+add r17 r17 r17
+add r17 r17 r20
+sw r22 0(r17)
+add r16 r16 r13
+j mark
+next:
+addi r13 r13 1
+j outer
+done:
+
+print:
+addi r5 r0 10
+addi r9 r0 0
+digits:
+divu r2 r5
+mfhi r6
+push r6
+addi r9 r9 1
+mflo r2
+bne r2 r0 digits
+emit:
+pop r6
+addi r6 r6 48
+tty r6
+addi r9 r9 -1
+bne r9 r0 emit
+halt
+
+#prints 31
+#limit 23560
+#elements 128
@@ -0,0 +1,73 @@
+# Ordena 16 números pseudoaleatorios por inserción y escribe
+# la suma de a[i] * (i + 1)
+addi r20 r0 16384
+addi r21 r0 16
+addi r3 r0 1
+addi r10 r0 171
+addi r11 r0 30269
+add r12 r20 r0
+addi r13 r0 0
+fill:
+mulu r3 r10
+mflo r3
+divu r3 r11
+mfhi r3
+sw r3 0(r12)
+addi r12 r12 4
+addi r13 r13 1
+bne r13 r21 fill
+
+addi r13 r0 1
+outer:
+beq r13 r21 sorted
+add r14 r13 r13
+add r14 r14 r14
+add r14 r14 r20
+lw r15 0(r14)
+inner:
+beq r14 r20 place
+lw r16 -4(r14)
+slt r17 r15 r16
+beq r17 r0 place
+sw r16 0(r14)
+addi r14 r14 -4
+j inner
+place:
+sw r15 0(r14)
+addi r13 r13 1
+j outer
+
+sorted:
+addi r2 r0 0
+addi r13 r0 0
+add r12 r20 r0
+sum:
+lw r16 0(r12)
+addi r13 r13 1
+mulu r16 r13
+mflo r16
+add r2 r2 r16
+addi r12 r12 4
+bne r13 r21 sum
+
+print:
+addi r5 r0 10
+addi r9 r0 0
+digits:
+divu r2 r5
+mfhi r6
+push r6
+addi r9 r9 1
+mflo r2
+bne r2 r0 digits
+emit:
+pop r6
+addi r6 r6 48
+tty r6
+addi r9 r9 -1
+bne r9 r0 emit
+halt
+
+#prints 2525839
+#limit 7848
+#elements 16
@@ -0,0 +1,866 @@
+"""Netlist de un diseño de Logisim y análisis de caminos críticos.
+
+Los cables y los pines de los componentes se conectan por coordenadas: los
+extremos de cada cable se unen con union-find y los túneles con la misma
+etiqueta forman una sola red. Las entradas de cada componente son los puntos
+de conexión que caen dentro de su contorno aproximado (girado según `facing`)
+y las salidas los que quedan en el lado hacia el que mira. Con una tabla de
+retardos por componente se calcula el camino combinacional más largo entre
+registros, subiendo por la jerarquía de subcircuitos con un resumen de
+retardos puerto a puerto de cada uno."""
+
+import argparse
+import sys
+from abc import ABC, abstractmethod
+from collections import namedtuple
+
+from price import PriceTable, Pricer, get_comp_id
+
+# Retardos en unidades de compuerta. Para los componentes secuenciales es el
+# retardo de reloj a salida; los de cableado no tienen retardo.
+DEFAULT_DELAYS = {
+    "0": {
+        "Bit Extender": 0,
+    },
+    "1": {
+        "NOT Gate": 1,
+        "Buffer": 1,
+        "AND Gate": 1,
+        "OR Gate": 1,
+        "NAND Gate": 1,
+        "NOR Gate": 1,
+        "XOR Gate": 2,
+        "XNOR Gate": 2,
+        "Odd Parity": ("inputs", {"inputs": 5}),
+        "Even Parity": ("inputs", {"inputs": 5}),
+        "Controlled Buffer": 1,
+        "Controlled Inverter": 1,
+    },
+    "2": {
+        "Multiplexer": ("select + 1", {"select": 1}),
+        "Demultiplexer": ("select + 1", {"select": 1}),
+        "Decoder": ("select + 1", {"select": 1}),
+        "Priority Encoder": ("select + 1", {"select": 3}),
+        "BitSelector": 2,
+    },
+    "3": {
+        "Adder": ("width", {"width": 8}),
+        "Subtractor": ("width", {"width": 8}),
+        "Multiplier": ("2 * width", {"width": 8}),
+        "Divider": ("width * width // 4", {"width": 8}),
+        "Negator": ("width", {"width": 8}),
+        "Comparator": ("width", {"width": 8}),
+        "Shifter": 5,
+        "BitAdder": ("width", {"width": 8}),
+        "BitFinder": ("width", {"width": 8}),
+    },
+    "4": {
+        "D Flip-Flop": 1,
+        "T Flip-Flop": 1,
+        "J-K Flip-Flop": 1,
+        "S-R Flip-Flop": 1,
+        "Register": 1,
+        "Counter": 1,
+        "Shift Register": 1,
+        "Random": 1,
+        "RAM": 4,
+        "ROM": 4,
+    },
+}
+
+default_delays = PriceTable(DEFAULT_DELAYS)
+
+# Componentes que guardan estado: sus salidas inician caminos y sus entradas
+# los terminan
+SEQUENTIAL = {
+    "D Flip-Flop",
+    "T Flip-Flop",
+    "J-K Flip-Flop",
+    "S-R Flip-Flop",
+    "Register",
+    "Counter",
+    "Shift Register",
+    "Random",
+    "RAM",
+    "ROM",
+}
+# Componentes sin retardo que solo unen redes o no participan en la lógica
+WIRING = {"Tunnel", "Splitter", "Pin", "Probe", "Text", "Pull Resistor"}
+# Fuentes que no inician caminos
+CONSTANTS = {"Constant", "Power", "Ground"}
+# Fuentes y sumideros de E/S: se tratan como entradas y salidas primarias
+SOURCES = {"Clock", "Button", "Keyboard", "Joystick"}
+SINKS = {"TTY", "LED", "7-Segment Display", "Hex Digit Display", "DotMatrix"}
+
+GATES = {"AND Gate", "OR Gate", "NAND Gate", "NOR Gate", "XOR Gate", "XNOR Gate"}
+GATE_SIZES = {"narrow": 30, "medium": 50, "wide": 70}
+
+# Una conexión de un componente primitivo: (red de entrada/salida, ...)
+Part = namedtuple("Part", "comp kind inputs outputs")
+# Un paso de un camino: (ruta de subcircuitos, componente, ubicación, retardo)
+Step = namedtuple("Step", "path name loc delay")
+
+
+def parse_point(text):
+    x, y = text.strip("()").split(",")
+    return int(x), int(y)
+
+
+def rotate(dx, dy, facing):
+    """Gira un desplazamiento definido para `facing=east`."""
+    if facing == "north":
+        return dy, -dx
+    if facing == "south":
+        return -dy, dx
+    if facing == "west":
+        return -dx, -dy
+    return dx, dy
+
+
+def int_attr(attrs, name, default):
+    try:
+        return int(attrs.get(name, default))
+    except ValueError:
+        return default
+
+
+def shape(comp, attrs):
+    """Contorno aproximado (x0, y0, x1, y1) de un componente que mira al este,
+    relativo a su ubicación, y las salidas que no están en el borde este."""
+    name = comp.name
+    if name in GATES:
+        size = attrs.get("size", "50")
+        size = GATE_SIZES.get(size) or int_attr(attrs, "size", 50)
+        inputs = int_attr(attrs, "inputs", 5)
+        half = max(size, 10 * inputs) // 2
+        extra = 10 if name.startswith("X") else 0
+        # Se deja lugar a la izquierda para las entradas negadas
+        return (-size - extra - 10, -half, 0, half), ()
+    if name in ("NOT Gate", "Buffer"):
+        return (-30, -10, 0, 10), ()
+    if name in ("Controlled Buffer", "Controlled Inverter"):
+        return (-30, -10, 0, 20), ()
+    if name in ("Multiplexer", "Priority Encoder"):
+        n = 2 ** int_attr(attrs, "select", 1 if name == "Multiplexer" else 3)
+        half = 20 if n == 2 else 5 * n + 10
+        return (-30 if n == 2 else -40, -half, 0, half), ()
+    if name in ("Demultiplexer", "Decoder"):
+        n = 2 ** int_attr(attrs, "select", 1)
+        half = 20 if n == 2 else 5 * n + 10
+        return (0, -half, 30 if n == 2 else 40, half), ()
+    if name in ("Adder", "Subtractor", "Multiplier", "Divider"):
+        # Acarreo / resto en el borde inferior
+        return (-40, -20, 0, 20), ((-20, 20),)
+    if name in ("Comparator", "Negator", "Shifter", "Bit Extender", "BitAdder", "BitFinder"):
+        return (-40, -20, 0, 20), ()
+    if name in ("Register", "Counter", "Random", "Shift Register"):
+        return (-30, -20, 0, 20), ()
+    if name.endswith("Flip-Flop"):
+        return (-40, -10, 0, 30), ()
+    if name in ("RAM", "ROM"):
+        return (-140, -40, 0, 40), ()
+    if name == "BitSelector":
+        return (-30, -20, 0, 20), ()
+    return None, ()
+
+
+class UnionFind:
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, x):
+        parent = self.parent
+        root = parent.setdefault(x, x)
+        while root != parent[root]:
+            root = parent[root]
+        # Compresión de caminos
+        while x != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    def union(self, a, b):
+        a = self.find(a)
+        b = self.find(b)
+        if a != b:
+            self.parent[b] = a
+
+
+class PointIndex:
+    """Índice de los puntos de conexión de un circuito por celdas, para
+    buscar los que caen dentro de un contorno."""
+
+    CELL = 40
+
+    def __init__(self, points):
+        cells = {}
+        for x, y in points:
+            cells.setdefault((x // self.CELL, y // self.CELL), set()).add((x, y))
+        self.cells = cells
+
+    def inside(self, x0, y0, x1, y1):
+        found = []
+        c = self.CELL
+        for cx in range(x0 // c, x1 // c + 1):
+            for cy in range(y0 // c, y1 // c + 1):
+                for x, y in self.cells.get((cx, cy), ()):
+                    if x0 <= x <= x1 and y0 <= y <= y1:
+                        found.append((x, y))
+        return found
+
+
+class Netlist:
+    """Redes y conexiones de los componentes de un circuito.
+
+    `parts` tiene un Part por componente con lógica; para los subcircuitos
+    `inputs` y `outputs` son tuplas (pin del puerto, red)."""
+
+    def __init__(self, circuit, design):
+        self.circuit = circuit
+        self.nets = UnionFind()
+        self.parts = []
+        self.input_pins = {}  # ubicación del pin -> red
+        self.output_pins = {}
+        self.build(design)
+
+    def net(self, point):
+        return self.nets.find(point)
+
+    def build(self, design):
+        circuit = self.circuit
+        nets = self.nets
+        points = set()
+        for wire in circuit.wires:
+            start, end = parse_point(wire.start), parse_point(wire.end)
+            nets.union(start, end)
+            points.add(start)
+            points.add(end)
+
+        tunnels = {}
+        placed = []  # (comp, attrs, ubicación, puertos del subcircuito)
+        for comp in circuit.comps:
+            attrs = dict(comp.attrs)
+            loc = parse_point(comp.loc)
+            ports = None
+            if get_comp_id(comp)[0] == "-1":
+                child = design.find_circuit(comp.name)
+                ports = []
+                facing = attrs.get("facing", "east")
+                for pin, (dx, dy) in subcircuit_ports(child) if child is not None else ():
+                    dx, dy = rotate(dx, dy, facing)
+                    point = (loc[0] + dx, loc[1] + dy)
+                    points.add(point)
+                    ports.append((pin, point))
+            else:
+                points.add(loc)
+            if comp.name == "Tunnel":
+                label = attrs.get("label", "")
+                if label in tunnels:
+                    nets.union(tunnels[label], loc)
+                else:
+                    tunnels[label] = loc
+            placed.append((comp, attrs, loc, ports))
+
+        index = PointIndex(points)
+        for point in points:
+            nets.find(point)
+
+        for comp, attrs, loc, ports in placed:
+            name = comp.name
+            if ports is not None:
+                child = design.find_circuit(name)
+                directions = pin_directions(child) if child is not None else {}
+                self.parts.append(
+                    Part(
+                        comp,
+                        "subcircuit",
+                        tuple((pin, p) for pin, p in ports if not directions.get(pin)),
+                        tuple((pin, p) for pin, p in ports if directions.get(pin)),
+                    )
+                )
+            elif name == "Splitter":
+                fanout = int_attr(attrs, "fanout", 2)
+                dx0, dy0 = rotate(20, -10 * fanout - 10, attrs.get("facing", "east"))
+                dx1, dy1 = rotate(20, 10 * fanout + 10, attrs.get("facing", "east"))
+                box = (
+                    loc[0] + min(dx0, dx1),
+                    loc[1] + min(dy0, dy1),
+                    loc[0] + max(dx0, dx1),
+                    loc[1] + max(dy0, dy1),
+                )
+                for point in index.inside(*box):
+                    nets.union(loc, point)
+            elif name == "Pin":
+                if attrs.get("output") == "true":
+                    self.output_pins[comp.loc] = loc
+                else:
+                    self.input_pins[comp.loc] = loc
+            elif name in WIRING:
+                continue
+            elif name in CONSTANTS or name in SOURCES:
+                kind = "constant" if name in CONSTANTS else "source"
+                self.parts.append(Part(comp, kind, (), (loc,)))
+            elif name in SINKS:
+                self.parts.append(Part(comp, "sink", (loc,), ()))
+            else:
+                box, extra = shape(comp, attrs)
+                if box is None:
+                    continue
+                facing = attrs.get("facing", "east")
+                (dx0, dy0), (dx1, dy1) = rotate(box[0], box[1], facing), rotate(box[2], box[3], facing)
+                east = box[2]
+                outputs = []
+                inputs = []
+                extra = {rotate(dx, dy, facing) for dx, dy in extra}
+                for point in index.inside(
+                    loc[0] + min(dx0, dx1),
+                    loc[1] + min(dy0, dy1),
+                    loc[0] + max(dx0, dx1),
+                    loc[1] + max(dy0, dy1),
+                ):
+                    dx, dy = point[0] - loc[0], point[1] - loc[1]
+                    # Volver a la orientación este para saber de qué lado está
+                    ex, ey = rotate(dx, dy, {"north": "south", "south": "north"}.get(facing, facing))
+                    if ex == east or (dx, dy) in extra:
+                        outputs.append(point)
+                    else:
+                        inputs.append(point)
+                kind = "sequential" if name in SEQUENTIAL else "combinational"
+                self.parts.append(Part(comp, kind, tuple(inputs), tuple(outputs)))
+
+        # Los puntos se convierten a redes cuando ya están todas las uniones
+        self.parts = [
+            part._replace(
+                inputs=tuple((pin, nets.find(p)) for pin, p in part.inputs),
+                outputs=tuple((pin, nets.find(p)) for pin, p in part.outputs),
+            )
+            if part.kind == "subcircuit"
+            else part._replace(
+                inputs=tuple({nets.find(p) for p in part.inputs}),
+                outputs=tuple({nets.find(p) for p in part.outputs}),
+            )
+            for part in self.parts
+        ]
+        self.input_pins = {pin: nets.find(p) for pin, p in self.input_pins.items()}
+        self.output_pins = {pin: nets.find(p) for pin, p in self.output_pins.items()}
+
+
+def subcircuit_ports(circuit):
+    """Puertos (ubicación del pin, desplazamiento desde el ancla) con los que
+    se dibuja una instancia del circuito: los de su apariencia, o los de la
+    apariencia por defecto de Logisim si no tiene <appear>."""
+    if circuit.ports is not None:
+        return circuit.ports
+    return default_ports(circuit)
+
+
+def default_ports(circuit):
+    """Puertos de la apariencia por defecto de Logisim (DefaultAppearance):
+    cada pin va en el lado contrario al que mira, ordenado por su posición
+    en el circuito y a 10 de distancia de los otros pines del lado; el ancla
+    es el primer puerto del lado este (o norte, oeste, sur)."""
+    edges = {"north": [], "south": [], "east": [], "west": []}
+    opposite = {"east": "west", "west": "east", "north": "south", "south": "north"}
+    for comp in circuit.comps:
+        if comp.name == "Pin":
+            facing = dict(comp.attrs).get("facing", "east")
+            edges[opposite.get(facing, "west")].append(comp)
+    for edge, pins in edges.items():
+        if edge in ("north", "south"):
+            pins.sort(key=lambda comp: parse_point(comp.loc))
+        else:
+            pins.sort(key=lambda comp: parse_point(comp.loc)[::-1])
+
+    count = {edge: len(pins) for edge, pins in edges.items()}
+    max_vert = max(count["north"], count["south"])
+    max_horz = max(count["east"], count["west"])
+
+    def offset(facing, opposite, max_others):
+        max_this = max(facing, opposite)
+        if max_this <= 1:
+            base = 15 if max_others == 0 else 10
+        elif max_this == 2:
+            base = 10
+        else:
+            base = 5 if max_others == 0 else 10
+        return base + 10 * ((max_this - facing) // 2)
+
+    def dimension(max_this, max_others):
+        if max_this < 3:
+            return 30
+        return 10 * max_this if max_others == 0 else 10 * max_this + 10
+
+    offs = {
+        "north": offset(count["north"], count["south"], max_horz),
+        "south": offset(count["south"], count["north"], max_horz),
+        "east": offset(count["east"], count["west"], max_vert),
+        "west": offset(count["west"], count["east"], max_vert),
+    }
+    width = dimension(max_vert, max_horz)
+    height = dimension(max_horz, max_vert)
+
+    if count["east"]:
+        anchor = (width, offs["east"])
+    elif count["north"]:
+        anchor = (offs["north"], 0)
+    elif count["west"]:
+        anchor = (0, offs["west"])
+    elif count["south"]:
+        anchor = (offs["south"], height)
+    else:
+        anchor = (0, 0)
+
+    starts = {
+        "west": ((0, offs["west"]), (0, 10)),
+        "east": ((width, offs["east"]), (0, 10)),
+        "north": ((offs["north"], 0), (10, 0)),
+        "south": ((offs["south"], height), (10, 0)),
+    }
+    ports = []
+    for edge in ("west", "east", "north", "south"):
+        (x, y), (dx, dy) = starts[edge]
+        for i, comp in enumerate(edges[edge]):
+            ports.append((comp.loc, (x + i * dx - anchor[0], y + i * dy - anchor[1])))
+    return ports
+
+
+def pin_directions(circuit):
+    """Ubicación de cada pin del circuito -> True si es de salida."""
+    return {
+        comp.loc: dict(comp.attrs).get("output") == "true"
+        for comp in circuit.comps
+        if comp.name == "Pin"
+    }
+
+
+class CircuitAnalyzer(ABC):
+    """Base de los análisis jerárquicos: arma la netlist de cada circuito una
+    vez y memoriza el resumen que devuelve `analyze` para usarlo en los
+    circuitos que lo contienen."""
+
+    def __init__(self, design):
+        self.design = design
+        self.summaries = {}
+        self.netlists = {}
+
+    def netlist(self, name):
+        netlist = self.netlists.get(name)
+        if netlist is None:
+            netlist = Netlist(self.design.find_circuit(name), self.design)
+            self.netlists[name] = netlist
+        return netlist
+
+    def summarize(self, top):
+        """Analiza `top` y los subcircuitos que contiene, cada uno después de
+        sus hijos (el postorden de `Pricer.hierarchy`), así la profundidad del
+        diseño no pesa en la pila. Un diseño recursivo lanza
+        CircuitCycleError."""
+        _, postorder = self.design.hierarchy(top)
+        for name in postorder:
+            if name not in self.summaries and self.design.find_circuit(name) is not None:
+                self.summaries[name] = self.analyze(name)
+        return self.summary(top)
+
+    def summary(self, name):
+        """Resumen ya calculado de `name`; un subcircuito inexistente se toma
+        como caja negra."""
+        return self.summaries.get(name, self.empty)
+
+    @abstractmethod
+    def analyze(self, name):
+        """Resumen del circuito `name`. Los resúmenes de sus subcircuitos ya
+        están en `summaries`."""
+
+
+Summary = namedtuple("Summary", "comb arrive require worst loops")
+
+
+class TimingAnalyzer(CircuitAnalyzer):
+    """Calcula y memoriza el resumen de retardos de cada circuito:
+
+    - comb: (pin de entrada, pin de salida) -> camino combinacional más largo
+    - arrive: pin de salida -> camino más largo desde un registro interno
+    - require: pin de entrada -> camino más largo hasta un registro interno
+    - worst: camino más largo entre registros dentro del circuito
+
+    Cada camino es (retardo, [Step, ...])."""
+
+    empty = Summary({}, {}, {}, None, 0)
+
+    def __init__(self, design, delays=None):
+        super().__init__(design)
+        self.delays = default_delays if delays is None else delays
+
+    def analyze(self, name):
+        netlist = self.netlist(name)
+        edges = {}  # red -> [(red destino, retardo, pasos)]
+        launches = {}  # red -> (retardo, pasos)
+        captures = {}  # red -> (retardo, pasos) que se suma al llegar
+        worst = None
+
+        def add_edge(src, dst, delay, steps):
+            if src != dst:
+                edges.setdefault(src, []).append((dst, delay, steps))
+
+        def add_launch(net, delay, steps):
+            if net not in launches or launches[net][0] < delay:
+                launches[net] = (delay, steps)
+
+        def add_capture(net, delay, steps):
+            if net not in captures or captures[net][0] < delay:
+                captures[net] = (delay, steps)
+
+        for part in netlist.parts:
+            comp = part.comp
+            if part.kind == "subcircuit":
+                child = self.summary(comp.name)
+                prefix = (comp.name,)
+                ins = dict(part.inputs)
+                outs = dict(part.outputs)
+                for (p, q), (delay, steps) in child.comb.items():
+                    if p in ins and q in outs:
+                        add_edge(ins[p], outs[q], delay, prefixed(prefix, steps))
+                for q, (delay, steps) in child.arrive.items():
+                    if q in outs:
+                        add_launch(outs[q], delay, prefixed(prefix, steps))
+                for p, (delay, steps) in child.require.items():
+                    if p in ins:
+                        add_capture(ins[p], delay, prefixed(prefix, steps))
+                if child.worst is not None and (worst is None or child.worst[0] > worst[0]):
+                    worst = (child.worst[0], prefixed(prefix, child.worst[1]))
+                continue
+
+            delay = self.delays.component_price(comp) if part.kind in ("combinational", "sequential") else 0
+            step = [Step((), comp.name, comp.loc, delay)]
+            if part.kind == "combinational":
+                for src in part.inputs:
+                    for dst in part.outputs:
+                        add_edge(src, dst, delay, step)
+            elif part.kind in ("sequential", "source"):
+                for dst in part.outputs:
+                    add_launch(dst, delay, step)
+                if part.kind == "sequential":
+                    for src in part.inputs:
+                        add_capture(src, 0, [Step((), comp.name, comp.loc, 0)])
+            elif part.kind == "sink":
+                for src in part.inputs:
+                    add_capture(src, 0, [Step((), comp.name, comp.loc, 0)])
+
+        order, loops = topological_order(edges)
+
+        # Caminos desde los registros internos
+        arrival = longest_paths(order, edges, launches)
+        for net, (delay, steps) in captures.items():
+            if net in arrival:
+                total = arrival[net][0] + delay
+                if worst is None or total > worst[0]:
+                    worst = (total, trail(arrival, net) + steps)
+        arrive = {}
+        for pin, net in netlist.output_pins.items():
+            if net in arrival:
+                arrive[pin] = (arrival[net][0], trail(arrival, net))
+
+        # Caminos desde cada pin de entrada
+        comb = {}
+        require = {}
+        for pin, net in netlist.input_pins.items():
+            start = [Step((), "Pin", pin, 0)]
+            arrival = longest_paths(order, edges, {net: (0, start)})
+            for out_pin, out_net in netlist.output_pins.items():
+                if out_net in arrival:
+                    comb[(pin, out_pin)] = (arrival[out_net][0], trail(arrival, out_net))
+            for net, (delay, steps) in captures.items():
+                if net in arrival:
+                    total = arrival[net][0] + delay
+                    if pin not in require or total > require[pin][0]:
+                        require[pin] = (total, trail(arrival, net) + steps)
+
+        return Summary(comb, arrive, require, worst, loops)
+
+    def critical_path(self, name):
+        """Camino más largo del circuito tomando también como extremos sus
+        pines: entre registros, de entrada a registro, de registro a salida y
+        de entrada a salida."""
+        summary = self.summarize(name)
+        candidates = [summary.worst]
+        candidates += summary.require.values()
+        candidates += summary.arrive.values()
+        candidates += summary.comb.values()
+        candidates = [c for c in candidates if c is not None]
+        if not candidates:
+            return None
+        return max(candidates, key=lambda c: c[0])
+
+    def loops(self):
+        """Cantidad de lazos combinacionales ignorados por circuito."""
+        return {name: s.loops for name, s in self.summaries.items() if s.loops}
+
+
+Liveness = namedtuple("Liveness", "deps always dead")
+
+
+class DeadLogicAnalyzer(CircuitAnalyzer):
+    """Busca los componentes que no afectan ninguna salida.
+
+    Desde los pines de salida y los sumideros (TTY, LEDs, ...) se recorren
+    hacia atrás las redes y los componentes que las manejan. El resumen de
+    cada circuito guarda:
+
+    - deps: pin de salida -> pines de entrada de los que depende
+    - always: pines de entrada que llegan a un sumidero interno
+    - dead: [(componente, costo)] que no llegan a ninguna salida"""
+
+    empty = Liveness({}, frozenset(), [])
+
+    def __init__(self, design, top):
+        super().__init__(design)
+        self.top = top
+        # La factura da el precio de los subcircuitos que sobran enteros
+        design.price_circuit(top)
+
+    def analyze(self, name):
+        netlist = self.netlist(name)
+        drivers = {}  # red -> [(índice del componente, pin del puerto)]
+        roots = list(netlist.output_pins.values())
+        always_live = set()
+        for i, part in enumerate(netlist.parts):
+            if part.kind == "subcircuit":
+                child = self.summary(part.comp.name)
+                ins = dict(part.inputs)
+                for pin, net in part.outputs:
+                    drivers.setdefault(net, []).append((i, pin))
+                if child.always:
+                    always_live.add(i)
+                    roots.extend(ins[pin] for pin in child.always if pin in ins)
+                continue
+            for net in part.outputs:
+                drivers.setdefault(net, []).append((i, None))
+            if part.kind == "sink":
+                always_live.add(i)
+                roots.extend(part.inputs)
+
+        def walk(start):
+            live = set()
+            seen = set(start)
+            pending = list(start)
+            while pending:
+                net = pending.pop()
+                for i, pin in drivers.get(net, ()):
+                    if (i, pin) in live:
+                        continue
+                    live.add((i, pin))
+                    part = netlist.parts[i]
+                    if pin is None:
+                        inputs = part.inputs
+                    else:
+                        ins = dict(part.inputs)
+                        deps = self.summary(part.comp.name).deps.get(pin, ())
+                        inputs = [ins[p] for p in deps if p in ins]
+                    for source in inputs:
+                        if source not in seen:
+                            seen.add(source)
+                            pending.append(source)
+            return live, seen
+
+        deps = {}
+        for pin, net in netlist.output_pins.items():
+            _, nets = walk([net])
+            deps[pin] = frozenset(p for p, n in netlist.input_pins.items() if n in nets)
+        sink_roots = [net for net in roots if net not in set(netlist.output_pins.values())]
+        _, nets = walk(sink_roots)
+        always = frozenset(p for p, n in netlist.input_pins.items() if n in nets)
+
+        live, _ = walk(roots)
+        live_parts = {i for i, _ in live} | always_live
+        dead = []
+        for i, part in enumerate(netlist.parts):
+            if i in live_parts:
+                continue
+            if part.kind == "subcircuit":
+                entry = self.design.circuit_bill.get(part.comp.name)
+                cost = 0 if entry is None else entry["price"]
+            else:
+                cost = self.design.prices.component_price(part.comp)
+            dead.append((part.comp, cost))
+        return Liveness(deps, always, dead)
+
+    def report(self):
+        """Componentes sin efecto de cada circuito alcanzable desde `top`,
+        con cuántas veces aparece cada circuito en el diseño (sin contar las
+        instancias que sobran) y el costo total que se ahorraría."""
+        self.summarize(self.top)
+        order = self.hierarchy_order()
+        counts = {self.top: 1}
+        for name in order:
+            summary = self.summary(name)
+            dead = {id(comp) for comp, _ in summary.dead}
+            for part in self.netlist(name).parts:
+                if part.kind == "subcircuit" and id(part.comp) not in dead:
+                    child = part.comp.name
+                    counts[child] = counts.get(child, 0) + counts.get(name, 0)
+        rows = []
+        for name in order:
+            dead = self.summary(name).dead
+            if dead:
+                rows.append((name, counts.get(name, 0), dead))
+        return rows
+
+    def hierarchy_order(self):
+        """Circuitos alcanzables desde `top`, cada padre antes que sus hijos."""
+        _, postorder = self.design.hierarchy(self.top)
+        return [name for name in reversed(postorder) if name in self.summaries]
+
+
+def print_dead_logic(rows):
+    total = 0
+    for name, count, dead in rows:
+        cost = sum(c for _, c in dead)
+        total += cost * count
+        print(f"\n{name} (x{count}): {len(dead)} componentes sin efecto, costo {cost}")
+        for comp, c in sorted(dead, key=lambda item: (-item[1], item[0].name)):
+            print("{:>12}  {} {}".format(c, comp.name, comp.loc))
+    print(f"\n{'='*50}")
+    print(f"AHORRO POSIBLE: {total}")
+    print(f"{'='*50}")
+
+
+def prefixed(prefix, steps):
+    return [step._replace(path=prefix + step.path) for step in steps]
+
+
+def topological_order(edges):
+    """Orden de las redes con DFS iterativo. Las aristas que cierran un ciclo
+    (lazos combinacionales o uniones aproximadas) se ignoran y se cuentan."""
+    state = {}
+    order = []
+    loops = 0
+    for root in list(edges):
+        if root in state:
+            continue
+        state[root] = 1
+        stack = [(root, iter(edges.get(root, ())))]
+        while stack:
+            node, children = stack[-1]
+            for dst, _, _ in children:
+                mark = state.get(dst)
+                if mark is None:
+                    state[dst] = 1
+                    stack.append((dst, iter(edges.get(dst, ()))))
+                    break
+                if mark == 1:
+                    loops += 1
+            else:
+                state[node] = 2
+                order.append(node)
+                stack.pop()
+    order.reverse()
+    return order, loops
+
+
+def longest_paths(order, edges, sources):
+    """Camino más largo hasta cada red alcanzable desde `sources`.
+    Devuelve red -> (retardo, red anterior, pasos)."""
+    position = {net: i for i, net in enumerate(order)}
+    arrival = {net: (delay, None, steps) for net, (delay, steps) in sources.items()}
+    for net in order:
+        current = arrival.get(net)
+        if current is None:
+            continue
+        here = position[net]
+        for dst, delay, steps in edges.get(net, ()):
+            if position.get(dst, here + 1) <= here:
+                continue  # Arista que cierra un lazo
+            total = current[0] + delay
+            if dst not in arrival or arrival[dst][0] < total:
+                arrival[dst] = (total, net, steps)
+    return arrival
+
+
+def trail(arrival, net):
+    """Reconstruye los pasos del camino que llega a `net`."""
+    parts = []
+    seen = set()
+    while net is not None and net not in seen:
+        seen.add(net)
+        _, previous, steps = arrival[net]
+        parts.append(steps)
+        net = previous
+    return [step for steps in reversed(parts) for step in steps]
+
+
+def load_design(input_file):
+    """Carga el archivo y sus librerías conservando la geometría."""
+    design = Pricer(keep_layout=True)
+    design.load(input_file)
+    return design
+
+
+def print_path(name, path):
+    delay, steps = path
+    print(f"\n{'='*50}")
+    print(f"CAMINO CRÍTICO DE '{name}': {delay}")
+    print(f"{'='*50}")
+    total = 0
+    for step in steps:
+        total += step.delay
+        if step.name == "Pin":
+            continue  # Solo marca el paso de un subcircuito a otro
+        where = " > ".join((name,) + step.path)
+        print("{:>6} {:>6}  {:<40} {} {}".format(step.delay, total, where, step.name, step.loc))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("file", help="The logisim file")
+    parser.add_argument("circuit_name", help="The circuit to analyze.")
+    parser.add_argument(
+        "-p",
+        "--delays",
+        help="JSON or TOML sheet that overrides the default component delays.",
+    )
+    parser.add_argument(
+        "-a",
+        "--all",
+        action="store_true",
+        help="Also print the critical path of every subcircuit.",
+    )
+    parser.add_argument(
+        "-d",
+        "--dead",
+        action="store_true",
+        help="List the components that affect no output and the cost of removing them.",
+    )
+    args = parser.parse_args()
+
+    try:
+        delays = None
+        if args.delays is not None:
+            delays = PriceTable(DEFAULT_DELAYS).load(args.delays)
+
+        design = load_design(args.file)
+        if args.circuit_name not in design.document.circuits:
+            raise ValueError("There is no circuit called {}".format(args.circuit_name))
+
+        if args.dead:
+            print_dead_logic(DeadLogicAnalyzer(design, args.circuit_name).report())
+            return
+
+        analyzer = TimingAnalyzer(design, delays)
+        path = analyzer.critical_path(args.circuit_name)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        exit(1)
+    if args.all:
+        for name in sorted(analyzer.summaries):
+            sub = analyzer.critical_path(name)
+            if sub is not None and name != args.circuit_name:
+                print_path(name, sub)
+    if path is None:
+        print("No paths found in {}".format(args.circuit_name))
+    else:
+        print_path(args.circuit_name, path)
+    for name, loops in sorted(analyzer.loops().items()):
+        print("{}: {} lazos combinacionales ignorados".format(name, loops))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,64 +2,662 @@ from __future__ import division
 
 import xml.etree.ElementTree as ET
 import argparse
+import ast
+import csv
 import json
+import hashlib
+import io
 import os
+import pickle
+import sys
+import threading
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 
-circuit_bill = {}
-xml_root = None
-detailed = False
-library_roots = {}  # Cache para los XML roots de las librerías (key = nombre del circuito)
-all_roots = []  # Lista de todos los roots cargados para buscar circuitos
-base_path = ""  # Path base para resolver rutas relativas de librerías
-
-
-def load_external_libraries(root, lib_base_path=None):
-    """Carga las librerías externas referenciadas en el archivo .circ"""
-    global library_roots
-    global all_roots
-    
-    if lib_base_path is None:
-        lib_base_path = base_path
-    
-    # Agregar este root a la lista de roots si no está ya
-    if root not in all_roots:
-        all_roots.append(root)
-        
-    for lib in root.findall("lib"):
-        desc = lib.get("desc", "")
-        if desc.startswith("file#"):
-            # Es una librería externa
-            lib_path = desc[5:]  # Quitar "file#"
-            full_path = os.path.normpath(os.path.join(lib_base_path, lib_path))
-            
-            if full_path not in library_roots:  # Evitar cargar el mismo archivo dos veces
-                if os.path.exists(full_path):
-                    try:
-                        lib_root = ET.parse(full_path).getroot()
-                        library_roots[full_path] = lib_root
-                        all_roots.append(lib_root)
-                        # Cargar librerías anidadas recursivamente usando el directorio de esta librería
-                        lib_dir = os.path.dirname(full_path)
-                        load_external_libraries(lib_root, lib_dir)
-                    except Exception as e:
-                        print(f"Error loading library {lib_path}: {e}")
-                else:
-                    print(f"Library file not found: {full_path}")
+# Forma compacta de un .circ: solo lo que se necesita para calcular precios.
+# Los atributos de un componente son una tupla de pares (nombre, valor).
+Comp = namedtuple("Comp", "lib name loc attrs")
+Wire = namedtuple("Wire", "start end")
+Circuit = namedtuple("Circuit", "name path comps wires ports subcircuits")
+Document = namedtuple("Document", "path libs circuits")
+
+# Atributos que solo afectan el dibujo del componente y no su precio
+LAYOUT_ATTRS = frozenset(
+    (
+        "label",
+        "labelfont",
+        "labelloc",
+        "labelcolor",
+        "font",
+        "text",
+        "halign",
+        "valign",
+        "color",
+        "bg",
+        "facing",
+        "contents",
+        "appear",
+        "radix",
+        "tooltip",
+    )
+)
+
+# Documentos .circ ya parseados, compartidos (solo lectura) entre todos los
+# Pricer del proceso: (path, keep_layout) -> (mtime, Document)
+parsed_documents = {}
+parsed_documents_lock = threading.Lock()
+
+
+def load_document(path, keep_layout=False, source=None):
+    """Lee un .circ con iterparse y devuelve su forma compacta (Document).
+
+    Cada elemento se libera en cuanto se procesa, así nunca está el árbol
+    completo en memoria. Con `keep_layout=False` se descartan los bloques
+    <appear> y los atributos de LAYOUT_ATTRS; con `keep_layout=True` se
+    conservan todos los atributos y los puertos de la apariencia, como
+    pares (ubicación del pin, posición relativa al ancla). Si se da `source`
+    (un archivo abierto) se lee de ahí en lugar de abrir `path`."""
+    intern = sys.intern
+    libs = []
+    circuits = {}
+    comps = wires = ports = None
+    attrs = []
+    anchor = None
+    depth = 0
+    root = None
+
+    for event, elem in ET.iterparse(source or path, events=("start", "end")):
+        tag = elem.tag
+        if event == "start":
+            depth += 1
+            if root is None:
+                root = elem
+            elif depth == 2 and tag == "circuit":
+                comps, wires, ports, anchor = [], [], [], None
+            continue
+
+        depth -= 1
+        if comps is not None and tag == "a" and depth == 3:
+            name = elem.get("name")
+            if keep_layout or name not in LAYOUT_ATTRS:
+                attrs.append((intern(name), intern(elem.get("val", elem.text or ""))))
+        elif comps is not None and tag == "comp":
+            comps.append(
+                Comp(elem.get("lib"), intern(elem.get("name")), elem.get("loc"), tuple(attrs))
+            )
+            attrs.clear()
+        elif comps is not None and tag == "wire":
+            wires.append(Wire(elem.get("from"), elem.get("to")))
+        elif keep_layout and comps is not None and tag == "circ-port":
+            x = int(elem.get("x")) + int(elem.get("width")) // 2
+            y = int(elem.get("y")) + int(elem.get("height")) // 2
+            ports.append(("({})".format(elem.get("pin")), (x, y)))
+        elif keep_layout and comps is not None and tag == "circ-anchor":
+            anchor = (
+                int(elem.get("x")) + int(elem.get("width")) // 2,
+                int(elem.get("y")) + int(elem.get("height")) // 2,
+            )
+        elif depth == 1 and tag == "circuit":
+            name = elem.get("name")
+            if keep_layout and anchor is not None:
+                ports = [(pin, (x - anchor[0], y - anchor[1])) for pin, (x, y) in ports]
+            else:
+                ports = None
+            if name not in circuits:
+                subcircuits = tuple(c.name for c in comps if not is_default(c))
+                circuits[name] = Circuit(name, path, comps, wires, ports, subcircuits)
+            comps = wires = ports = None
+        elif depth == 1 and tag == "lib":
+            libs.append((elem.get("name"), elem.get("desc", "")))
+
+        if depth <= 2:
+            # Liberar el elemento ya procesado y sus hijos
+            elem.clear()
+            if depth == 1:
+                root.clear()
+
+    return Document(path, libs, circuits)
+
+
+def parse_document(path, keep_layout=False):
+    """Devuelve la forma compacta de un .circ, leyéndolo solo si no está en
+    la caché o si cambió desde la última vez."""
+    path = os.path.normpath(os.path.abspath(path))
+    mtime = os.path.getmtime(path)
+    key = (path, keep_layout)
+    cached = parsed_documents.get(key)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    document = load_document(path, keep_layout)
+    with parsed_documents_lock:
+        parsed_documents[key] = (mtime, document)
+    return document
+
+
+def pack_document(document):
+    """Convierte un Document en tuplas y listas simples, para guardarlo en
+    disco o enviarlo a otro proceso sin depender de las clases de price.py."""
+    return (
+        document.path,
+        document.libs,
+        [
+            (c.name, c.path, [tuple(x) for x in c.comps], [tuple(w) for w in c.wires], c.ports, c.subcircuits)
+            for c in document.circuits.values()
+        ],
+    )
+
+
+def unpack_document(packed):
+    path, libs, circuits = packed
+    return Document(
+        path,
+        libs,
+        {
+            name: Circuit(
+                name,
+                circuit_path,
+                [Comp(*c) for c in comps],
+                [Wire(*w) for w in wires],
+                ports,
+                subcircuits,
+            )
+            for name, circuit_path, comps, wires, ports, subcircuits in circuits
+        },
+    )
+
+
+class DiskCache:
+    """Caché en disco de las librerías ya parseadas y de los subtotales de
+    cada circuito.
+
+    Cada documento se guarda en su forma compacta junto al mtime, tamaño y
+    hash del contenido del archivo: si el mtime cambió pero el contenido no,
+    no se vuelve a parsear. El subtotal de un circuito se guarda con una
+    clave que combina el hash de su archivo, los precios usados y las claves
+    de sus subcircuitos, así solo se recalculan los circuitos que dependen
+    de un archivo modificado."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(os.path.join(directory, "documents"), exist_ok=True)
+        self.subtotals_path = os.path.join(directory, "subtotals.json")
+        self.subtotals = None
+        self.lock = threading.Lock()
+
+    def document_path(self, path):
+        name = hashlib.sha1(path.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, "documents", name + ".pickle")
+
+    def document(self, path):
+        """Devuelve (Document, hash del contenido) de un .circ."""
+        path = os.path.normpath(os.path.abspath(path))
+        stat = os.stat(path)
+        cache_file = self.document_path(path)
+        entry = None
+        try:
+            with open(cache_file, "rb") as file:
+                entry = pickle.load(file)
+        except (OSError, EOFError, pickle.UnpicklingError, ValueError):
+            pass
+
+        if entry is not None and (entry["mtime"], entry["size"]) == (stat.st_mtime, stat.st_size):
+            return unpack_document(entry["document"]), entry["hash"]
+
+        with open(path, "rb") as file:
+            data = file.read()
+        digest = hashlib.sha256(data).hexdigest()
+        if entry is not None and entry["hash"] == digest:
+            document = entry["document"]
+        else:
+            document = pack_document(load_document(path, source=io.BytesIO(data)))
+        with open(cache_file, "wb") as file:
+            pickle.dump(
+                {"mtime": stat.st_mtime, "size": stat.st_size, "hash": digest, "document": document},
+                file,
+                pickle.HIGHEST_PROTOCOL,
+            )
+        return unpack_document(document), digest
+
+    def subtotal(self, circuit, key):
+        """Subtotal guardado de `circuit` si su clave no cambió."""
+        with self.lock:
+            if self.subtotals is None:
+                try:
+                    with open(self.subtotals_path, "r") as file:
+                        self.subtotals = json.load(file)
+                except (OSError, ValueError):
+                    self.subtotals = {}
+            entry = self.subtotals.get(circuit.path + "#" + circuit.name)
+        if entry is not None and entry["key"] == key:
+            return entry
+        return None
+
+    def store_subtotal(self, circuit, key, price, parts):
+        with self.lock:
+            if self.subtotals is None:
+                self.subtotals = {}
+            self.subtotals[circuit.path + "#" + circuit.name] = {
+                "key": key,
+                "price": price,
+                "parts": parts,
+            }
+
+    def save(self):
+        with self.lock:
+            if self.subtotals is None:
+                return
+            tmp = self.subtotals_path + ".tmp"
+            with open(tmp, "w") as file:
+                json.dump(self.subtotals, file)
+            os.replace(tmp, self.subtotals_path)
+
+
+def scan_libraries(path):
+    """Lee solo la cabecera de un .circ (hasta el primer circuito) y devuelve
+    los `desc` de sus librerías. Si el archivo no se puede leer devuelve una
+    lista vacía; el error se reporta al cargarlo."""
+    libs = []
+    try:
+        for event, elem in ET.iterparse(path, events=("start", "end")):
+            if event == "start":
+                if elem.tag in ("main", "options", "mappings", "toolbar", "circuit"):
+                    break
+            elif elem.tag == "lib":
+                libs.append(elem.get("desc", ""))
+    except (OSError, ET.ParseError):
+        pass
+    return libs
+
+
+def _preload_library(job):
+    """Parsea una librería en un proceso del pool. Con caché en disco la
+    guarda ahí; sin ella devuelve la forma compacta para el proceso padre."""
+    path, cache_directory, keep_layout = job
+    try:
+        if cache_directory is not None:
+            DiskCache(cache_directory).document(path)
+            return path, None, None
+        mtime = os.path.getmtime(path)
+        return path, mtime, pack_document(load_document(path, keep_layout))
+    except Exception:
+        # El error se reporta al cargar la librería en orden
+        return path, None, None
 
 
-def find_circuit_root(circuit_name):
-    """Busca el root que contiene la definición de un circuito"""
-    for root in all_roots:
-        if root.find("./circuit[@name='{}']".format(circuit_name)) is not None:
-            return root
-    return None
+def clear_cache():
+    """Descarta los documentos parseados compartidos."""
+    with parsed_documents_lock:
+        parsed_documents.clear()
+
+
+class CircuitCycleError(ValueError):
+    """Un circuito se usa a sí mismo, directa o indirectamente."""
+
+    def __init__(self, path):
+        self.path = path
+        super().__init__("Cyclic subcircuit reference: {}".format(" -> ".join(path)))
+
+
+# Estados del recorrido de la jerarquía
+VISITING = 1
+DONE = 2
+
+
+class Pricer:
+    """Calcula el precio de un circuito y sus librerías.
+
+    Cada instancia tiene su propia factura, así se pueden calcular varios
+    circuitos o variantes del diseño en el mismo proceso. Los documentos
+    parseados se comparten entre instancias mediante `parse_document`."""
+
+    def __init__(
+        self, detailed=False, prices=None, cache=None, jobs=1, locations=None, keep_layout=False
+    ):
+        self.detailed = detailed
+        self.keep_layout = keep_layout  # Conservar la geometría (para netlist.py)
+        self.locations = locations  # Archivo opcional donde escribir cada instancia
+        self.jobs = jobs  # Procesos para parsear las librerías en paralelo
+        self.prices = default_prices if prices is None else prices
+        self.cache = cache  # DiskCache opcional
+        self.digests = {}  # path del documento -> hash de su contenido
+        self.circuit_keys = {}  # Nombre del circuito -> clave de su subtotal
+        self.circuit_bill = {}
+        self.document = None
+        self.library_documents = {}  # path de la librería -> Document
+        self.documents = []  # Todos los documentos cargados para buscar circuitos
+        self.circuit_index = {}  # Nombre del circuito -> Circuit
+
+    def load(self, input_file):
+        """Carga el .circ principal y sus librerías externas."""
+        self.document = self.parse(input_file)
+        self.add_document(self.document)
+        base = os.path.dirname(os.path.abspath(input_file))
+        if self.jobs > 1:
+            self.preload_libraries(self.document, base)
+        # Cargar las librerías externas relativas al archivo principal
+        self.load_external_libraries(self.document, base)
+        return self.document
+
+    def discover_libraries(self, document, lib_base_path):
+        """Recorre el grafo de librerías leyendo solo las cabeceras y devuelve
+        los paths de todas las librerías existentes, cada una una vez."""
+        found = []
+        seen = set()
+        pending = [([desc for _, desc in document.libs], lib_base_path)]
+        while pending:
+            descs, base = pending.pop()
+            for desc in descs:
+                if not desc.startswith("file#"):
+                    continue
+                full_path = os.path.normpath(os.path.join(base, desc[5:]))
+                if full_path in seen or not os.path.exists(full_path):
+                    continue
+                seen.add(full_path)
+                found.append(full_path)
+                pending.append((scan_libraries(full_path), os.path.dirname(full_path)))
+        return found
+
+    def preload_libraries(self, document, lib_base_path):
+        """Parsea en un pool de procesos las librerías que no están en caché.
+        Después `load_external_libraries` las toma de la caché en orden, por
+        lo que los mensajes de error no cambian."""
+        paths = []
+        for path in self.discover_libraries(document, lib_base_path):
+            cached = parsed_documents.get((path, self.keep_layout))
+            if self.cache is None and cached is not None and cached[0] == os.path.getmtime(path):
+                continue
+            paths.append(path)
+        if len(paths) < 2:
+            return
+
+        directory = None if self.cache is None or self.keep_layout else self.cache.directory
+        jobs = [(path, directory, self.keep_layout) for path in paths]
+        with ProcessPoolExecutor(max_workers=min(self.jobs, len(paths))) as pool:
+            for path, mtime, packed in pool.map(_preload_library, jobs):
+                if packed is not None:
+                    with parsed_documents_lock:
+                        parsed_documents[(path, self.keep_layout)] = (
+                            mtime,
+                            unpack_document(packed),
+                        )
+
+    def parse(self, path):
+        if self.cache is None or self.keep_layout:
+            return parse_document(path, self.keep_layout)
+        document, digest = self.cache.document(path)
+        self.digests[document.path] = digest
+        return document
+
+    def add_document(self, document):
+        """Agrega un documento al índice. Si un nombre de circuito se repite
+        se conserva el del primer documento cargado."""
+        self.documents.append(document)
+        for name, circuit in document.circuits.items():
+            self.circuit_index.setdefault(name, circuit)
+
+    def load_external_libraries(self, document, lib_base_path):
+        """Carga las librerías externas referenciadas en el archivo .circ"""
+        for _, desc in document.libs:
+            if desc.startswith("file#"):
+                # Es una librería externa
+                lib_path = desc[5:]  # Quitar "file#"
+                full_path = os.path.normpath(os.path.join(lib_base_path, lib_path))
+
+                if full_path not in self.library_documents:  # Evitar cargar el mismo archivo dos veces
+                    if os.path.exists(full_path):
+                        try:
+                            lib_document = self.parse(full_path)
+                            self.library_documents[full_path] = lib_document
+                            self.add_document(lib_document)
+                            # Cargar librerías anidadas recursivamente usando el directorio de esta librería
+                            lib_dir = os.path.dirname(full_path)
+                            self.load_external_libraries(lib_document, lib_dir)
+                        except Exception as e:
+                            print(f"Error loading library {lib_path}: {e}")
+                    else:
+                        print(f"Library file not found: {full_path}")
+
+    def find_circuit(self, circuit_name):
+        """Busca en el índice la definición de un circuito"""
+        return self.circuit_index.get(circuit_name)
+
+    def bill(self, input_file, circuit_name):
+        """Calcula la factura de `circuit_name`, definido en `input_file`."""
+        self.load(input_file)
+
+        if circuit_name not in self.document.circuits:
+            raise ValueError("There is no circuit called {}".format(circuit_name))
+
+        self.price_circuit(circuit_name)
+        if self.cache is not None:
+            self.cache.save()
+
+        return self.circuit_bill
+
+    def cost_stacks(self, circuit_name):
+        """Costo de cada pila `circuito;subcircuito;...;componente` a partir
+        de la factura ya calculada, multiplicando por la cantidad de veces que
+        aparece cada subcircuito en su padre."""
+        stacks = {}
+        pending = [((circuit_name,), 1)]
+        while pending:
+            path, multiplier = pending.pop()
+            circuit = self.find_circuit(path[-1])
+            entry = self.circuit_bill.get(path[-1])
+            if circuit is None or entry is None:
+                continue
+            children = {}
+            for name in circuit.subcircuits:
+                children[name] = children.get(name, 0) + 1
+            for comp_id, part in entry["parts"].items():
+                if comp_id in children or not part["total cost"]:
+                    continue
+                stack = path + (comp_id,)
+                stacks[stack] = stacks.get(stack, 0) + part["total cost"] * multiplier
+            for name, amount in children.items():
+                if name not in path:
+                    pending.append((path + (name,), multiplier * amount))
+        return stacks
+
+    def circuit_key(self, circuit):
+        """Clave del subtotal de un circuito: cambia si cambia su archivo, la
+        tabla de precios o la clave de alguno de sus subcircuitos."""
+        key = self.circuit_keys.get(circuit.name)
+        if key is not None:
+            return key
+        self.circuit_keys[circuit.name] = "cycle"
+        digest = hashlib.sha256()
+        for part in (
+            self.digests.get(circuit.path, ""),
+            circuit.name,
+            self.prices.fingerprint(),
+            str(self.detailed),
+        ):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        for name in sorted(set(circuit.subcircuits)):
+            child = self.find_circuit(name)
+            digest.update(("missing:" + name if child is None else self.circuit_key(child)).encode("utf-8"))
+            digest.update(b"\0")
+        key = digest.hexdigest()
+        self.circuit_keys[circuit.name] = key
+        return key
+
+    @staticmethod
+    def add_unit(part, groups, comp_id, info):
+        """Agrupa las unidades iguales de un componente en la factura
+        detallada. La firma son los atributos sin la posición (los extremos
+        de los cables), así cada grupo guarda una sola vez los atributos."""
+        attrs = {k: v for k, v in info.items() if k not in UNIT_POSITION_KEYS}
+        signature = (comp_id, tuple(sorted(attrs.items())))
+        group = groups.get(signature)
+        if group is None:
+            group = {"attrs": attrs, "amount": 0, "unit cost": info["price"], "total cost": 0}
+            del attrs["price"]
+            groups[signature] = group
+            part["units"].append(group)
+        group["amount"] += 1
+        group["total cost"] += info["price"]
+
+    def write_locations(self, circuit):
+        """Escribe una línea JSON por instancia de la definición del circuito
+        en `self.locations`, sin guardarlas en la factura."""
+        out = self.locations
+        for c in circuit.comps:
+            out.write(
+                json.dumps({"circuit": circuit.name, "component": c.name, "loc": c.loc})
+            )
+            out.write("\n")
+        for w in circuit.wires:
+            out.write(
+                json.dumps(
+                    {"circuit": circuit.name, "component": "Wire", "from": w.start, "to": w.end}
+                )
+            )
+            out.write("\n")
+
+    def hierarchy(self, circuit_name):
+        """Recorre con una pila explícita los subcircuitos alcanzables desde
+        `circuit_name` y devuelve (preorden, postorden) de sus nombres; en el
+        postorden cada circuito aparece después de todos sus subcircuitos.
+        Los circuitos que no se encuentran no se incluyen. Si un circuito se
+        contiene a sí mismo se lanza CircuitCycleError con la ruta."""
+        preorder = [circuit_name]
+        postorder = []
+        state = {circuit_name: VISITING}
+        root = self.find_circuit(circuit_name)
+        stack = [(circuit_name, iter(root.subcircuits if root is not None else ()))]
+        while stack:
+            name, children = stack[-1]
+            for child in children:
+                mark = state.get(child)
+                if mark == VISITING:
+                    path = [entry[0] for entry in stack]
+                    raise CircuitCycleError(path[path.index(child):] + [child])
+                if mark is None:
+                    circuit = self.find_circuit(child)
+                    if circuit is None:
+                        continue
+                    state[child] = VISITING
+                    preorder.append(child)
+                    stack.append((child, iter(circuit.subcircuits)))
+                    break
+            else:
+                state[name] = DONE
+                postorder.append(name)
+                stack.pop()
+        return preorder, postorder
+
+    def price_circuit(self, circuit_name):
+        """Calcula el precio de `circuit_name` y de sus subcircuitos, cada uno
+        una sola vez y en orden topológico, y pone en `amount` cuántas veces
+        aparece cada uno en la jerarquía de `circuit_name`."""
+        preorder, postorder = self.hierarchy(circuit_name)
+        circuit_bill = self.circuit_bill
+        # Las entradas se crean en preorden para que la factura quede en el
+        # orden en que se recorre el diseño
+        pending = [name for name in preorder if name not in circuit_bill]
+        for name in pending:
+            circuit_bill[name] = {"price": 0, "amount": 0, "parts": {}}
+        pending = set(pending)
+        for name in postorder:
+            if name in pending:
+                self.price_definition(self.find_circuit(name))
+
+        amounts = {circuit_name: 1}
+        for name in reversed(postorder):
+            amount = amounts.get(name, 0)
+            circuit_bill[name]["amount"] = amount
+            for child in self.find_circuit(name).subcircuits:
+                amounts[child] = amounts.get(child, 0) + amount
+        return circuit_bill.get(circuit_name, {"price": 0})["price"]
+
+    def price_definition(self, circuit):
+        """Precio de una definición de circuito. Sus subcircuitos ya tienen
+        que estar en la factura."""
+        circuit_bill = self.circuit_bill
+        entry = circuit_bill[circuit.name]
+
+        if self.locations is not None:
+            self.write_locations(circuit)
+
+        subtotal_key = None
+        if self.cache is not None and circuit.path in self.digests:
+            subtotal_key = self.circuit_key(circuit)
+            cached = self.cache.subtotal(circuit, subtotal_key)
+            if cached is not None:
+                entry["price"] = cached["price"]
+                entry["parts"] = cached["parts"]
+                return
+
+        price = 0
+        parts = entry["parts"]
+        groups = {}  # (comp_id, firma) -> grupo de unidades iguales
+
+        for c in circuit.comps + circuit.wires:
+            key = get_comp_id(c)
+            if key[0] == "-1":
+                child = circuit_bill.get(c.name)
+                if child is None:
+                    print(f"Circuit not found: {c.name}")
+                    info = {"price": 0}
+                else:
+                    info = {"price": child["price"]}
+            elif self.detailed:
+                info = get_default_circuit_info(c, self.prices)
+            else:
+                info = {"price": self.prices.component_price(c, key)}
+            part_price = info["price"]
+            price += part_price
+            comp_id = key[1]
+            if comp_id in parts:
+                parts[comp_id]["amount"] += 1
+                parts[comp_id]["total cost"] += part_price
+            else:
+                data = {"amount": 1, "total cost": part_price}
+                if self.detailed:
+                    data["units"] = []
+                parts[comp_id] = data
+            if self.detailed:
+                self.add_unit(parts[comp_id], groups, comp_id, info)
+
+        entry["price"] = price
+        if subtotal_key is not None:
+            self.cache.store_subtotal(circuit, subtotal_key, price, parts)
 
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("file", help="The logisim file")
+    parser.add_argument("file", nargs="?", help="The logisim file")
     parser.add_argument(
-        "circuit_name", help="The name of the circuit to calculate the price."
+        "circuit_name", nargs="?", help="The name of the circuit to calculate the price."
+    )
+    parser.add_argument(
+        "-b",
+        "--batch",
+        nargs="+",
+        metavar="FILE",
+        help="Price several files in one process, sharing the parsed libraries.",
+    )
+    parser.add_argument(
+        "-n",
+        "--circuit",
+        action="append",
+        dest="circuits",
+        metavar="NAME",
+        help="Circuit to price in batch mode (can be repeated).",
+    )
+    parser.add_argument(
+        "--all",
+        action="store_true",
+        help="Price every circuit defined in each batch file and its libraries.",
+    )
+    parser.add_argument(
+        "--format",
+        choices=["json", "csv"],
+        default="json",
+        help="Output format of the batch table.",
     )
     parser.add_argument(
         "-d",
@@ -79,40 +677,78 @@ def main():
         default=0,
         help="Fail if the component exceed the limit price.",
     )
+    parser.add_argument(
+        "-p",
+        "--prices",
+        help="JSON or TOML price sheet that overrides the default component prices.",
+    )
+    parser.add_argument(
+        "-c",
+        "--cache",
+        help="Directory to keep parsed libraries and circuit subtotals between runs.",
+    )
+    parser.add_argument(
+        "--locations",
+        help="File to stream the location of every component instance to (JSON lines).",
+    )
+    parser.add_argument(
+        "--flamegraph",
+        help="File to write the cost of every subcircuit path as collapsed stacks.",
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        help="Print the N most expensive subcircuit paths and component types.",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of processes used to parse the libraries in parallel.",
+    )
 
     args = parser.parse_args()
 
-    global xml_root
-    global detailed
-    global base_path
-    global library_roots
+    if args.batch is not None:
+        return batch_main(args)
+    if args.file is None or args.circuit_name is None:
+        parser.error("the following arguments are required: file, circuit_name")
 
     input_file = args.file  # "s-mips.circ"
     output_file = args.output  # "result.json"
     circuit_name = args.circuit_name  # "S-MIPS"
     ensure_limit = args.limit  # 100
     detailed = args.detailed  # False
-    
-    # Establecer el path base para resolver librerías
-    base_path = os.path.dirname(os.path.abspath(input_file))
-
-    xml_root = ET.parse(input_file).getroot()
-    
-    # Cargar las librerías externas
-    load_external_libraries(xml_root)
-
-    _main = xml_root.find("./circuit[@name='{}']".format(circuit_name))
-    if _main is None:
-        print("There is no circuit called {}".format(circuit_name))
-        exit(1)
 
-    get_circuit_info(_main)
+    locations = None
+    try:
+        prices = None
+        if args.prices is not None:
+            prices = PriceTable().load(args.prices)
+        locations = None if args.locations is None else open(args.locations, "w")
+        cache = None if args.cache is None else DiskCache(args.cache)
+        pricer = Pricer(detailed, prices, cache, args.jobs, locations)
+        circuit_bill = pricer.bill(input_file, circuit_name)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        exit(1)
+    finally:
+        if locations is not None:
+            locations.close()
 
     if output_file is None:
         print(json.dumps(circuit_bill, indent=4))
     else:
         json.dump(circuit_bill, open(output_file, "w"), indent=4)
 
+    if args.flamegraph is not None or args.top is not None:
+        stacks = pricer.cost_stacks(circuit_name)
+        if args.flamegraph is not None:
+            with open(args.flamegraph, "w") as out:
+                write_collapsed_stacks(stacks, out)
+        print_top_costs(stacks, 10 if args.top is None else args.top)
+
     # Mostrar resumen del precio total
     total_price = circuit_bill[circuit_name]["price"]
     print(f"\n{'='*50}")
@@ -124,81 +760,117 @@ def main():
         exit(1)
 
 
-def bill(input_file, circuit_name):
-    global xml_root
-    global detailed
-    global base_path
-    global library_roots
+def write_collapsed_stacks(stacks, out):
+    """Escribe las pilas en el formato de flamegraph.pl / speedscope:
+    `S-MIPS;Data Path;ALU;Multiplier 4096`."""
+    for stack in sorted(stacks):
+        out.write("{} {}\n".format(";".join(stack), stacks[stack]))
+
 
-    # Establecer el path base para resolver librerías
-    base_path = os.path.dirname(os.path.abspath(input_file))
-    
-    xml_root = ET.parse(input_file).getroot()
-    
-    # Cargar las librerías externas
-    load_external_libraries(xml_root)
+def top_costs(stacks, n=10):
+    """Los `n` subcircuitos (por ruta, costo inclusivo) y los `n` tipos de
+    componente más caros."""
+    by_path = {}
+    by_type = {}
+    for stack, cost in stacks.items():
+        for i in range(1, len(stack)):
+            path = stack[:i]
+            by_path[path] = by_path.get(path, 0) + cost
+        by_type[stack[-1]] = by_type.get(stack[-1], 0) + cost
 
-    _main = xml_root.find("./circuit[@name='{}']".format(circuit_name))
-    if _main is None:
-        raise ValueError("There is no circuit called {}".format(circuit_name))
+    def largest(costs):
+        return sorted(costs.items(), key=lambda item: (-item[1], item[0]))[:n]
 
-    get_circuit_info(_main)
+    return largest(by_path), largest(by_type)
 
-    return circuit_bill
 
+def print_top_costs(stacks, n=10):
+    total = sum(stacks.values()) or 1
+    by_path, by_type = top_costs(stacks, n)
+    print(f"\nTOP {n} SUBCIRCUITOS")
+    for path, cost in by_path:
+        print("{:>14} {:6.1f}%  {}".format(cost, 100 * cost / total, " > ".join(path)))
+    print(f"\nTOP {n} COMPONENTES")
+    for name, cost in by_type:
+        print("{:>14} {:6.1f}%  {}".format(cost, 100 * cost / total, name))
 
-def get_circuit_info(comp, level=0):
-    if level > 100:
+
+def batch_main(args):
+    """Modo --batch: una fila por (archivo, circuito) con su precio total."""
+    if not args.all and not args.circuits:
+        print("Use -n/--circuit or --all to choose the circuits to price")
         exit(1)
-    if is_default(comp):
-        return get_default_circuit_info(comp)
-    
-    circuit_name = comp.get("name")
-    
-    # print("\t"*level + circuit_name)
-
-    # Si ya procesamos este circuito, devolver su precio (se incrementa amount en el padre)
-    if circuit_name in circuit_bill:
-        circuit_bill[circuit_name]["amount"] += 1
-        return {"price": circuit_bill[circuit_name]["price"]}
-
-    # Buscar el root que contiene este circuito
-    search_root = find_circuit_root(circuit_name)
-    if search_root is None:
-        print(f"Circuit not found: {circuit_name}")
-        return {"price": 0}
-
-    price = 0
-    parts = search_root.findall("./circuit[@name='{}']/comp".format(circuit_name))
-    parts.extend(search_root.findall("./circuit[@name='{}']/wire".format(circuit_name)))
-
-    circuit_bill[circuit_name] = {"price": 0, "amount": 1, "parts": {}}
-
-    for c in parts:
-        info = get_circuit_info(c, level + 1)
-        part_price = info["price"]
-        price += part_price
-        comp_id = get_comp_id(c)[1]
-        if comp_id in circuit_bill[circuit_name]["parts"]:
-            circuit_bill[circuit_name]["parts"][comp_id]["amount"] += 1
-            if detailed:
-                circuit_bill[circuit_name]["parts"][comp_id]["units"].append(info)
-            circuit_bill[circuit_name]["parts"][comp_id]["total cost"] += part_price
+    try:
+        prices = None
+        if args.prices is not None:
+            prices = PriceTable().load(args.prices)
+        cache = None if args.cache is None else DiskCache(args.cache)
+        rows = bill_table(
+            args.batch, None if args.all else args.circuits, prices, cache, args.jobs
+        )
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        exit(1)
+    for row in rows:
+        row["limit"] = args.limit or None
+        row["ok"] = not args.limit or row["price"] <= args.limit
+
+    out = sys.stdout if args.output is None else open(args.output, "w", newline="")
+    try:
+        if args.format == "csv":
+            writer = csv.DictWriter(out, ["file", "circuit", "price", "limit", "ok"])
+            writer.writeheader()
+            writer.writerows(rows)
         else:
-            data = {"amount": 1, "total cost": part_price}
-            if detailed:
-                data["units"] = [info]
-            circuit_bill[circuit_name]["parts"][comp_id] = data
+            json.dump(rows, out, indent=4)
+            out.write("\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    failed = [row for row in rows if not row["ok"]]
+    for row in failed:
+        print(
+            f"ERROR: El precio de '{row['circuit']}' en {row['file']} ({row['price']}) "
+            f"excede el límite ({args.limit})"
+        )
+    if failed:
+        exit(1)
+
 
-    circuit_bill[circuit_name]["price"] = price
-    return {"price": price}
+def bill_table(input_files, circuit_names=None, prices=None, cache=None, jobs=1):
+    """Precio total de varios circuitos en varios archivos.
+
+    Los documentos parseados se comparten entre los archivos (por la caché de
+    `parse_document` o la DiskCache), así cada librería se lee una vez aunque
+    la usen varias variantes. Los nombres se buscan en el archivo y en sus
+    librerías; con `circuit_names=None` se calculan todos esos circuitos."""
+    rows = []
+    for input_file in input_files:
+        pricer = Pricer(prices=prices, cache=cache, jobs=jobs)
+        pricer.load(input_file)
+        names = circuit_names or list(pricer.circuit_index)
+        for name in names:
+            if pricer.find_circuit(name) is None:
+                raise ValueError("There is no circuit called {} in {}".format(name, input_file))
+            pricer.price_circuit(name)
+            rows.append(
+                {"file": input_file, "circuit": name, "price": pricer.circuit_bill[name]["price"]}
+            )
+    if cache is not None:
+        cache.save()
+    return rows
+
+
+def bill(input_file, circuit_name, detailed=False, prices=None):
+    return Pricer(detailed, prices).bill(input_file, circuit_name)
 
 
 def is_default(comp):
     """Determina si un componente es un componente predefinido de Logisim o un wire"""
-    if comp.tag == "wire":
+    if isinstance(comp, Wire):
         return True
-    lib_id = comp.get("lib")
+    lib_id = comp.lib
     if lib_id is None:
         return False
     # Las librerías 0-6 son las incorporadas de Logisim
@@ -211,203 +883,286 @@ def is_default(comp):
 
 def get_comp_id(comp):
     if is_default(comp):
-        if comp.tag == "wire":
+        if isinstance(comp, Wire):
             key = ("0", "Wire")
         else:
-            key = (comp.get("lib"), comp.get("name"))
+            key = (comp.lib, comp.name)
     else:
-        key = ("-1", comp.get("name"))
+        key = ("-1", comp.name)
 
     return key
 
 
-def get_default_circuit_info(comp):
+# Claves de la información de una unidad que no forman parte de su firma
+UNIT_POSITION_KEYS = ("from", "to")
+
+
+def get_default_circuit_info(comp, prices=None):
+    prices = default_prices if prices is None else prices
     key = get_comp_id(comp)
-    if comp.tag == "wire":
-        info = {"from": comp.get("from"), "to": comp.get("to")}
+    if isinstance(comp, Wire):
+        info = {"from": comp.start, "to": comp.end}
     else:
-        info = {}
-        for prop in comp.findall("a"):
-            info[prop.get("name")] = prop.get("val")
+        info = dict(comp.attrs)
 
-    info["price"] = calculate_price(key, info)
+    info["price"] = prices.price(key, info)
 
     return info
 
 
 def calculate_price(key, info):
-    def get_value(key, val):
-        return int(info.get(key, val))
+    return default_prices.price(key, info)
 
-    price = 0
 
-    if key == ("0", "Wire"):
-        price = 0
-    elif key == ("6", "Text"):
-        price = 0
-    elif key == ("0", "Splitter"):
-        price = 0
-    elif key == ("0", "Tunnel"):
-        price = 0
-    elif key == ("0", "Pin"):
-        price = 1 if "pull" in info else 0
-    elif key == ("0", "Probe"):
-        price = 0
-    elif key == ("0", "Pull Resistor"):
-        price = 0
-    elif key == ("0", "Clock"):
-        price = 1
-    elif key == ("0", "Constant"):
-        price = 0
-    elif key == ("0", "Power"):
-        price = 0
-    elif key == ("0", "Ground"):
-        price = 0
-    elif key == ("0", "Transistor"):
-        price = 2
-    elif key == ("0", "Transmission Gate"):
-        price = 4
-    elif key == ("0", "Bit Extender"):
-        price = get_value("in_width", 8) + get_value("out_width", 16)
-
-    elif key == ("1", "NOT Gate"):
-        w = get_value("width", 1)
-        price = 2 * w
-    elif key == ("1", "Buffer"):
-        w = get_value("width", 1)
-        price = 2 * w
-    elif key == ("1", "AND Gate"):
-        w = get_value("width", 1)
-        price = (get_value("inputs", 5) + 1) * w
-    elif key == ("1", "OR Gate"):
-        w = get_value("width", 1)
-        price = (get_value("inputs", 5) + 1) * w
-    elif key == ("1", "NAND Gate"):
-        w = get_value("width", 1)
-        price = (get_value("inputs", 5) + 1) * w + 2 * w
-    elif key == ("1", "NOR Gate"):
-        w = get_value("width", 1)
-        price = (get_value("inputs", 5) + 1) * w + 2 * w
-    elif key == ("1", "XOR Gate"):
-        w = get_value("width", 1)
-        price = (get_value("inputs", 5) + 1) * w
-    elif key == ("1", "XNOR Gate"):
-        w = get_value("width", 1)
-        price = (get_value("inputs", 5) + 1) * w + 2 * w
-    elif key == ("1", "Odd Parity"):
-        w = get_value("width", 1)
-        price = (get_value("inputs", 5) + 4) * w
-    elif key == ("1", "Even Parity"):
-        w = get_value("width", 1)
-        price = (get_value("inputs", 5) + 4) * w
-    elif key == ("1", "Controlled Buffer"):
-        w = get_value("width", 1)
-        price = 3 * w
-    elif key == ("1", "Controlled Inverter"):
-        w = get_value("width", 1)
-        price = 3 * w
-
-    elif key == ("2", "Multiplexer"):
-        w = get_value("width", 1)
-        s = get_value("select", 1)
-        price = (2**s - 1) * w * 10
-    elif key == ("2", "Demultiplexer"):
-        w = get_value("width", 1)
-        s = get_value("select", 1)
-        price = (2**s - 1) * w * 7
-    elif key == ("2", "Decoder"):
-        s = get_value("select", 1)
-        price = 3 * s**2 - s
-    elif key == ("2", "Priority Encoder"):
-        s = get_value("select", 3)
-        n = 2**s
-        price = n**2 + 3 * n + s * n // 2
-    elif key == ("2", "BitSelector"):
-        w = get_value("width", 8)
-        o = get_value("group", 1)
-        price = w + o
-
-    elif key == ("3", "Adder"):
-        w = get_value("width", 8)
-        price = 4 * w
-    elif key == ("3", "Subtractor"):
-        w = get_value("width", 8)
-        price = 4 * w
-    elif key == ("3", "Multiplier"):
-        w = get_value("width", 8)
-        price = 4 * w**2
-    elif key == ("3", "Divider"):
-        w = get_value("width", 8)
-        price = 4 * w**2
-    elif key == ("3", "Negator"):
-        w = get_value("width", 8)
-        price = 2 * w
-    elif key == ("3", "Comparator"):
-        w = get_value("width", 8)
-        price = 16 + 4 * w
-    elif key == ("3", "Shifter"):
-        w = get_value("width", 8)
-        price = w**2
-    elif key == ("3", "BitAdder"):
-        w = get_value("width", 8)
-        price = 4 * w
-    elif key == ("3", "BitFinder"):
-        w = get_value("width", 8)
-        price = 4 * w
-
-    elif key == ("4", "D Flip-Flop"):
-        price = 24
-    elif key == ("4", "T Flip-Flop"):
-        price = 12
-    elif key == ("4", "J-K Flip-Flop"):
-        price = 12
-    elif key == ("4", "S-R Flip-Flop"):
-        price = 6
-    elif key == ("4", "Register"):
-        w = get_value("width", 8)
-        price = 24 * w
-    elif key == ("4", "Counter"):
-        w = get_value("width", 8)
-        price = 28 * w
-    elif key == ("4", "Shift Register"):
-        w = get_value("width", 1)
-        price = 40 * w
-    elif key == ("4", "Random"):
-        w = get_value("width", 8)
-        price = 5 * w
-    elif key == ("4", "RAM"):
-        a = get_value("addrWidth", 8)
-        w = get_value("dataWidth", 8)
-        price = 2**a * w * 8
-    elif key == ("4", "ROM"):
-        a = get_value("addrWidth", 8)
-        w = get_value("dataWidth", 8)
-        price = 2**a * w * 0.5
-
-    elif key == ("5", "Button"):
-        price = 2
-    elif key == ("5", "Joystick"):
-        price = 3000
-    elif key == ("5", "Keyboard"):
-        price = 3000
-    elif key == ("5", "LED"):
-        price = 10
-    elif key == ("5", "7-Segment Display"):
-        price = 100
-    elif key == ("5", "Hex Digit Display"):
-        price = 100
-    elif key == ("5", "DotMatrix"):
-        c = get_value("matrixcols", 5)
-        r = get_value("matrixrows", 7)
-        price = c * r * 0.01
-    elif key == ("5", "TTY"):
-        c = get_value("cols", 32)
-        r = get_value("rows", 8)
-        price = c * r * 0.05
-    else:
-        print("Unknown element {}".format(key))
+# Precios de los componentes de Logisim: (lib, nombre) -> precio fijo o
+# (fórmula, valores por defecto de los atributos que usa la fórmula)
+DEFAULT_PRICES = {
+    "0": {
+        "Wire": 0,
+        "Splitter": 0,
+        "Tunnel": 0,
+        "Pin": ("1 if pull else 0", {"pull": 0}),
+        "Probe": 0,
+        "Pull Resistor": 0,
+        "Clock": 1,
+        "Constant": 0,
+        "Power": 0,
+        "Ground": 0,
+        "Transistor": 2,
+        "Transmission Gate": 4,
+        "Bit Extender": ("in_width + out_width", {"in_width": 8, "out_width": 16}),
+    },
+    "1": {
+        "NOT Gate": ("2 * width", {"width": 1}),
+        "Buffer": ("2 * width", {"width": 1}),
+        "AND Gate": ("(inputs + 1) * width", {"width": 1, "inputs": 5}),
+        "OR Gate": ("(inputs + 1) * width", {"width": 1, "inputs": 5}),
+        "NAND Gate": ("(inputs + 1) * width + 2 * width", {"width": 1, "inputs": 5}),
+        "NOR Gate": ("(inputs + 1) * width + 2 * width", {"width": 1, "inputs": 5}),
+        "XOR Gate": ("(inputs + 1) * width", {"width": 1, "inputs": 5}),
+        "XNOR Gate": ("(inputs + 1) * width + 2 * width", {"width": 1, "inputs": 5}),
+        "Odd Parity": ("(inputs + 4) * width", {"width": 1, "inputs": 5}),
+        "Even Parity": ("(inputs + 4) * width", {"width": 1, "inputs": 5}),
+        "Controlled Buffer": ("3 * width", {"width": 1}),
+        "Controlled Inverter": ("3 * width", {"width": 1}),
+    },
+    "2": {
+        "Multiplexer": ("(2**select - 1) * width * 10", {"width": 1, "select": 1}),
+        "Demultiplexer": ("(2**select - 1) * width * 7", {"width": 1, "select": 1}),
+        "Decoder": ("3 * select**2 - select", {"select": 1}),
+        "Priority Encoder": (
+            "(2**select)**2 + 3 * 2**select + select * 2**select // 2",
+            {"select": 3},
+        ),
+        "BitSelector": ("width + group", {"width": 8, "group": 1}),
+    },
+    "3": {
+        "Adder": ("4 * width", {"width": 8}),
+        "Subtractor": ("4 * width", {"width": 8}),
+        "Multiplier": ("4 * width**2", {"width": 8}),
+        "Divider": ("4 * width**2", {"width": 8}),
+        "Negator": ("2 * width", {"width": 8}),
+        "Comparator": ("16 + 4 * width", {"width": 8}),
+        "Shifter": ("width**2", {"width": 8}),
+        "BitAdder": ("4 * width", {"width": 8}),
+        "BitFinder": ("4 * width", {"width": 8}),
+    },
+    "4": {
+        "D Flip-Flop": 24,
+        "T Flip-Flop": 12,
+        "J-K Flip-Flop": 12,
+        "S-R Flip-Flop": 6,
+        "Register": ("24 * width", {"width": 8}),
+        "Counter": ("28 * width", {"width": 8}),
+        "Shift Register": ("40 * width", {"width": 1}),
+        "Random": ("5 * width", {"width": 8}),
+        "RAM": ("2**addrWidth * dataWidth * 8", {"addrWidth": 8, "dataWidth": 8}),
+        "ROM": ("2**addrWidth * dataWidth * 0.5", {"addrWidth": 8, "dataWidth": 8}),
+    },
+    "5": {
+        "Button": 2,
+        "Joystick": 3000,
+        "Keyboard": 3000,
+        "LED": 10,
+        "7-Segment Display": 100,
+        "Hex Digit Display": 100,
+        "DotMatrix": ("matrixcols * matrixrows * 0.01", {"matrixcols": 5, "matrixrows": 7}),
+        "TTY": ("cols * rows * 0.05", {"cols": 32, "rows": 8}),
+    },
+    "6": {
+        "Text": 0,
+    },
+}
+
+# Nodos permitidos en las fórmulas de precios
+FORMULA_NODES = (
+    ast.Expression,
+    ast.BinOp,
+    ast.UnaryOp,
+    ast.BoolOp,
+    ast.Compare,
+    ast.IfExp,
+    ast.Constant,
+    ast.Name,
+    ast.Load,
+    ast.Add,
+    ast.Sub,
+    ast.Mult,
+    ast.Div,
+    ast.FloorDiv,
+    ast.Mod,
+    ast.Pow,
+    ast.USub,
+    ast.UAdd,
+    ast.Not,
+    ast.And,
+    ast.Or,
+    ast.Eq,
+    ast.NotEq,
+    ast.Lt,
+    ast.LtE,
+    ast.Gt,
+    ast.GtE,
+)
+
+
+def compile_formula(formula, defaults):
+    """Compila una fórmula aritmética sobre los atributos del componente.
+    Solo se permiten números, operadores y los atributos de `defaults`."""
+    try:
+        tree = ast.parse(str(formula), mode="eval")
+    except SyntaxError:
+        raise ValueError("Invalid price formula '{}'".format(formula))
+    for node in ast.walk(tree):
+        if not isinstance(node, FORMULA_NODES):
+            raise ValueError("Invalid price formula '{}'".format(formula))
+        if isinstance(node, ast.Name) and node.id not in defaults:
+            raise ValueError(
+                "Attribute '{}' of price formula '{}' has no default".format(
+                    node.id, formula
+                )
+            )
+        if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float)):
+            raise ValueError("Invalid price formula '{}'".format(formula))
+    return compile(tree, "<price formula>", "eval")
+
+
+def attribute_value(value):
+    """Los atributos de Logisim son strings; las fórmulas usan números."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return value
+
+
+class PriceTable:
+    """Registro (lib, nombre) -> fórmula de precio.
+
+    Los precios se memorizan por (lib, nombre) y los valores de los atributos
+    que usa la fórmula, así las instancias repetidas se calculan una vez."""
+
+    def __init__(self, prices=DEFAULT_PRICES):
+        self.formulas = {}
+        self.sources = {}
+        self.cache = {}
+        self.digest = None
+        self.update(prices)
+
+    def register(self, lib, name, formula, defaults=None):
+        defaults = dict(defaults or {})
+        self.formulas[(str(lib), name)] = (
+            compile_formula(formula, defaults),
+            tuple(defaults),  # atributos que usa la fórmula
+            tuple(defaults.values()),
+            {attr: i for i, attr in enumerate(defaults)},
+        )
+        self.sources[(str(lib), name)] = (str(formula), defaults)
+        self.cache.clear()
+        self.digest = None
+
+    def fingerprint(self):
+        """Hash de las fórmulas registradas, para invalidar subtotales."""
+        if self.digest is None:
+            self.digest = hashlib.sha256(
+                repr(sorted(self.sources.items())).encode("utf-8")
+            ).hexdigest()
+        return self.digest
+
+    def update(self, prices):
+        """Agrega o reemplaza precios con la estructura {lib: {nombre: precio}},
+        donde el precio es un número, una tupla (fórmula, defaults) o un dict
+        {"formula": ..., "defaults": {...}}."""
+        for lib, components in prices.items():
+            for name, entry in components.items():
+                if isinstance(entry, dict):
+                    self.register(lib, name, entry["formula"], entry.get("defaults"))
+                elif isinstance(entry, (tuple, list)):
+                    self.register(lib, name, *entry)
+                else:
+                    self.register(lib, name, entry)
+
+    def load(self, path):
+        """Carga una hoja de precios en JSON o TOML. Cualquier problema del
+        archivo (sintaxis, estructura o fórmulas) se reporta como ValueError."""
+        try:
+            if path.endswith(".toml"):
+                import tomllib
+
+                with open(path, "rb") as file:
+                    sheet = tomllib.load(file)
+            else:
+                with open(path, "r") as file:
+                    sheet = json.load(file)
+            self.update(sheet)
+        except OSError as e:
+            raise ValueError("Cannot read price sheet {}: {}".format(path, e.strerror))
+        except ValueError as e:
+            raise ValueError("Invalid price sheet {}: {}".format(path, e))
+        except (KeyError, TypeError, AttributeError) as e:
+            raise ValueError("Invalid price sheet {}: bad entry {}".format(path, e))
+        return self
+
+    def price(self, key, info):
+        entry = self.formulas.get(key)
+        if entry is None:
+            print("Unknown element {}".format(key))
+            return 0
+        values = tuple(info.get(attr, default) for attr, default in zip(entry[1], entry[2]))
+        return self.evaluate(key, entry, values)
+
+    def component_price(self, comp, key=None):
+        """Precio de un componente predefinido sin construir su dict de atributos."""
+        if key is None:
+            key = get_comp_id(comp)
+        entry = self.formulas.get(key)
+        if entry is None:
+            return self.price(key, {})
+        positions = entry[3]
+        if positions:
+            values = list(entry[2])
+            for name, val in getattr(comp, "attrs", ()):
+                i = positions.get(name)
+                if i is not None:
+                    values[i] = val
+            values = tuple(values)
+        else:
+            values = ()
+        return self.evaluate(key, entry, values)
+
+    def evaluate(self, key, entry, values):
+        cache_key = (key, values)
+        price = self.cache.get(cache_key)
+        if price is None:
+            namespace = {attr: attribute_value(v) for attr, v in zip(entry[1], values)}
+            price = eval(entry[0], {"__builtins__": {}}, namespace)
+            self.cache[cache_key] = price
+        return price
+
 
-    return price
+default_prices = PriceTable()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,299 @@
+"""Simulador de referencia del S-MIPS a nivel de instrucción.
+
+Ejecuta las imágenes `Bank` que genera assembler.py (o un .asm, que se
+ensambla antes) con la semántica que esperan los tests: los saltos
+condicionales son relativos a pc+1 en instrucciones, `j` lleva el número de
+instrucción y `jr` una dirección en bytes; `push`/`pop` usan r31 como puntero
+de pila en la misma memoria que el programa; `div`/`divu` dejan el cociente
+en lo y el resto en hi. No modela tiempos: cuenta instrucciones ejecutadas."""
+
+import argparse
+import random
+
+import assembler
+
+MASK = 0xFFFFFFFF
+
+# Códigos de operación que se distinguen por el campo funct
+FUNCT_OPCODES = {assembler.opcodes["add"], assembler.opcodes["push"], assembler.opcodes["halt"]}
+
+decoded_opcodes = {}
+decoded_functs = {}
+for _name, _opcode in assembler.opcodes.items():
+    if _opcode in FUNCT_OPCODES:
+        decoded_functs[(_opcode, assembler.functs[_name])] = _name
+    else:
+        decoded_opcodes[_opcode] = _name
+
+
+class SimulatorError(Exception):
+    def __init__(self, pc, reason):
+        self.pc = pc
+        self.reason = reason
+
+    def __str__(self):
+        return "Error at instruction %d: %s" % (self.pc, self.reason)
+
+
+def signed(value):
+    value &= MASK
+    return value - (1 << 32) if value & 0x80000000 else value
+
+
+def sign_extend16(value):
+    value &= 0xFFFF
+    return value - (1 << 16) if value & 0x8000 else value
+
+
+def decode(word):
+    """Nombre de la instrucción codificada en `word`, o None si no es válida."""
+    opcode = word >> 26
+    if opcode in FUNCT_OPCODES:
+        return decoded_functs.get((opcode, word & 0x3F))
+    return decoded_opcodes.get(opcode)
+
+
+def load_bank(path):
+    """Palabras de una imagen `Bank` (formato "v2.0 raw" de Logisim). Cada
+    línea es una palabra en little-endian."""
+    words = []
+    with open(path) as file:
+        header = file.readline()
+        if not header.startswith("v2.0 raw"):
+            raise ValueError("%s is not a Logisim memory image" % path)
+        for token in file.read().split():
+            token = token.split("*")[-1]  # Formato comprimido "N*valor"
+            words.append(int.from_bytes(bytes.fromhex(token.zfill(8)), "little"))
+    return words
+
+
+def load_program(path):
+    """Palabras del programa: la imagen `Bank` o un .asm que se ensambla."""
+    if path.endswith(".asm"):
+        instructions, _ = assembler.assemble_program(path)
+        return instructions
+    return load_bank(path)
+
+
+class Machine:
+    """Estado del procesador: registros, hi/lo, pc (en instrucciones) y la
+    memoria por palabras, con el programa cargado desde la dirección 0."""
+
+    def __init__(self, program, seed=0, keyboard=""):
+        self.memory = dict(enumerate(program))
+        self.regs = [0] * 32
+        self.hi = 0
+        self.lo = 0
+        self.pc = 0
+        self.steps = 0
+        self.halted = False
+        # Lo que hizo la última instrucción: (registro, valor) escrito y
+        # (dirección, es escritura) del acceso a memoria
+        self.written = None
+        self.access = None
+        self.output = []
+        self.keyboard = list(keyboard)
+        self.random = random.Random(seed)
+
+    def load(self, address):
+        self.access = (address & MASK, False)
+        return self.memory.get((address & MASK) >> 2, 0)
+
+    def store(self, address, value):
+        self.access = (address & MASK, True)
+        self.memory[(address & MASK) >> 2] = value & MASK
+
+    def push(self, value):
+        self.regs[31] = (self.regs[31] - 4) & MASK
+        self.store(self.regs[31], value)
+
+    def pop(self):
+        value = self.load(self.regs[31])
+        self.regs[31] = (self.regs[31] + 4) & MASK
+        return value
+
+    def step(self):
+        """Ejecuta una instrucción y devuelve su nombre."""
+        pc = self.pc
+        word = self.memory.get(pc, 0)
+        name = decode(word)
+        if name is None:
+            raise SimulatorError(pc, "invalid instruction %08x" % word)
+        rs = (word >> 21) & 31
+        rt = (word >> 16) & 31
+        rd = (word >> 11) & 31
+        imm = sign_extend16(word)
+        regs = self.regs
+        a, b = regs[rs], regs[rt]
+        next_pc = pc + 1
+        result = None  # (registro, valor)
+        self.access = None
+
+        if name == "add":
+            result = (rd, a + b)
+        elif name == "sub":
+            result = (rd, a - b)
+        elif name == "slt":
+            result = (rd, int(signed(a) < signed(b)))
+        elif name == "sltu":
+            result = (rd, int(a < b))
+        elif name == "and":
+            result = (rd, a & b)
+        elif name == "or":
+            result = (rd, a | b)
+        elif name == "nor":
+            result = (rd, ~(a | b))
+        elif name == "xor":
+            result = (rd, a ^ b)
+        elif name in ("mult", "mulu"):
+            product = signed(a) * signed(b) if name == "mult" else a * b
+            self.hi, self.lo = (product >> 32) & MASK, product & MASK
+        elif name in ("div", "divu"):
+            if b != 0:
+                if name == "div":
+                    x, y = signed(a), signed(b)
+                    quotient = abs(x) // abs(y) * (1 if (x < 0) == (y < 0) else -1)
+                    remainder = x - quotient * y
+                else:
+                    quotient, remainder = divmod(a, b)
+                self.hi, self.lo = remainder & MASK, quotient & MASK
+        elif name == "mfhi":
+            result = (rd, self.hi)
+        elif name == "mflo":
+            result = (rd, self.lo)
+        elif name == "jr":
+            next_pc = a >> 2
+        elif name == "addi":
+            result = (rt, a + imm)
+        elif name == "slti":
+            result = (rt, int(signed(a) < imm))
+        elif name == "sltiu":
+            result = (rt, int(a < (word & 0xFFFF)))
+        elif name == "andi":
+            result = (rt, a & (word & 0xFFFF))
+        elif name == "ori":
+            result = (rt, a | (word & 0xFFFF))
+        elif name == "xori":
+            result = (rt, a ^ (word & 0xFFFF))
+        elif name == "lw":
+            result = (rt, self.load(a + imm))
+        elif name == "sw":
+            self.store(a + imm, b)
+        elif name == "beq":
+            if a == b:
+                next_pc += imm
+        elif name == "bne":
+            if a != b:
+                next_pc += imm
+        elif name == "blez":
+            if signed(a) <= 0:
+                next_pc += imm
+        elif name == "bgtz":
+            if signed(a) > 0:
+                next_pc += imm
+        elif name == "bltz":
+            if signed(a) < 0:
+                next_pc += imm
+        elif name == "j":
+            next_pc = word & 0x3FFFFFF
+        elif name == "push":
+            self.push(a)
+        elif name == "pop":
+            # Si el destino es r31 gana el incremento del puntero de pila
+            value = self.pop()
+            if rd != 31:
+                result = (rd, value)
+        elif name == "tty":
+            self.output.append(chr(a & 0xFF))
+        elif name == "rnd":
+            result = (rd, self.random.getrandbits(32))
+        elif name == "kbd":
+            result = (rd, ord(self.keyboard.pop(0)) if self.keyboard else 0)
+        elif name == "halt":
+            self.halted = True
+            next_pc = pc
+
+        if result is not None and result[0] != 0:
+            regs[result[0]] = result[1] & MASK
+            self.written = (result[0], regs[result[0]])
+        elif name in ("push", "pop"):
+            self.written = (31, regs[31])
+        else:
+            self.written = None
+        self.pc = next_pc
+        self.steps += 1
+        return name
+
+    def run(self, max_steps=10_000_000):
+        """Ejecuta hasta `halt`. Devuelve la salida de la TTY."""
+        while not self.halted:
+            if self.steps >= max_steps:
+                raise SimulatorError(self.pc, "no halt after %d instructions" % max_steps)
+            self.step()
+        return self.text()
+
+    def text(self):
+        return "".join(self.output)
+
+
+BRANCHES = {"beq", "bne", "blez", "bgtz", "bltz"}
+HILO_WRITERS = {"mult", "mulu", "div", "divu"}
+HILO_READERS = {"mfhi", "mflo"}
+
+
+def coverage(program, max_steps=1_000_000):
+    """Características del procesador que ejercita el programa: cada
+    instrucción (par opcode/funct) ejecutada, cada salto condicional tomado y
+    no tomado, y qué operación escribió hi/lo antes de cada mfhi/mflo."""
+    machine = Machine(program)
+    features = set()
+    hilo = None
+    while not machine.halted:
+        if machine.steps >= max_steps:
+            raise SimulatorError(machine.pc, "no halt after %d instructions" % max_steps)
+        pc = machine.pc
+        name = machine.step()
+        features.add(name)
+        if name in BRANCHES:
+            features.add(name + (" taken" if machine.pc != pc + 1 else " not taken"))
+        elif name in HILO_WRITERS:
+            hilo = name
+        elif name in HILO_READERS:
+            features.add("{} after {}".format(name, hilo))
+    return features
+
+
+def static_coverage(program):
+    """Instrucciones presentes en el programa, sin ejecutarlo."""
+    return {name for name in map(decode, program) if name is not None}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("program", help="Bank image or .asm file to run.")
+    parser.add_argument(
+        "-m",
+        "--max-steps",
+        type=int,
+        default=10_000_000,
+        help="Stop with an error after this many instructions.",
+    )
+    parser.add_argument(
+        "-s", "--seed", type=int, default=0, help="Seed for the rnd instruction."
+    )
+    parser.add_argument(
+        "-k", "--keyboard", default="", help="Characters returned by kbd."
+    )
+    args = parser.parse_args()
+
+    machine = Machine(load_program(args.program), args.seed, args.keyboard)
+    try:
+        print(machine.run(args.max_steps))
+    except (SimulatorError, assembler.AssemblerError) as e:
+        print(e)
+        exit(1)
+    print("{} instrucciones".format(machine.steps))
+
+
+if __name__ == "__main__":
+    main()
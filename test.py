@@ -1,9 +1,22 @@
 import os
+import sys
+import glob
+import json
+import time
+import heapq
+import shlex
+import asyncio
 import subprocess
 import optparse
+import xml.etree.ElementTree as ET
+from collections import Counter
 
 import unittest
 
+import price
+import assembler
+import simulator
+
 verbose_level = 0
 verbose_level_all = 4
 verbose_level_compile_detail = 3
@@ -27,14 +40,23 @@ class TestCase:
         self.file = file
         self.expected_result = expected_result
         self.expected_speed = expected_speed
+        # Elementos que procesa un kernel de rendimiento (#elements)
+        self.elements: int | None = None
         self.test_name = test_name
         self.runned = False
         self.failed = False
         self.error = False
+        self.result: str | None = None
+        self.speed: int | None = None
+        # Frecuencia de simulacion reportada por Logisim y tiempos por fase (s)
+        self.hz: float | None = None
+        self.assemble_time: float = 0.0
+        self.startup_time: float = 0.0
+        self.simulate_time: float = 0.0
+        self.source: str | None = None
 
-    def run(self, logisim: str, circ: str, template: str) -> None:
-        # result = ""
-        cmd = [
+    def command(self, logisim: str, circ: str, template: str) -> list[str]:
+        return [
             logisim,
             template,
             "-tty",
@@ -45,11 +67,20 @@ class TestCase:
             template,
             circ,
         ]
+
+    def run(self, logisim: str, circ: str, template: str) -> None:
+        # result = ""
+        cmd = self.command(logisim, circ, template)
+        self.runned = False
+        self.failed = False
+        self.error = False
         try:
             print_verbose(
                 verbose_level_test_detail, "Ejecutando el test: ", self.test_name
             )
+            start = time.perf_counter()
             result = subprocess.run(cmd, stdout=subprocess.PIPE)
+            wall = time.perf_counter() - start
             self.runned = True
             if result.returncode != 0:
                 print("Error al ejecutar test: ", self.test_name)
@@ -58,16 +89,7 @@ class TestCase:
                 self.error = True
                 self.failed = True
                 return
-            output = bytes.decode(result.stdout)
-            r = output.find("halted due to halt pin")
-            self.result = output[:r].strip()
-            s = output.find("Hz (")
-            e = output.find(" ticks", s)
-            self.speed = int(output[s + 4 : e])
-
-            self.failed = self.result != self.expected_result or (
-                self.expected_speed != None and self.speed > self.expected_speed
-            )
+            self.parse_output(bytes.decode(result.stdout), wall)
 
         except subprocess.CalledProcessError as e:
             print("Error al ejecutar test: ", self.test_name)
@@ -76,6 +98,94 @@ class TestCase:
             self.error = True
             self.failed = True
 
+    async def run_async(self, logisim: str, circ: str, template: str) -> None:
+        """Igual que `run` pero sin bloquear el loop de asyncio."""
+        self.runned = False
+        self.failed = False
+        self.error = False
+        start = time.perf_counter()
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *self.command(logisim, circ, template),
+                stdout=asyncio.subprocess.PIPE,
+            )
+            stdout, _ = await process.communicate()
+        except OSError as e:
+            print("Error al ejecutar test: ", self.test_name)
+            print(e)
+            self.error = True
+            self.failed = True
+            return
+        wall = time.perf_counter() - start
+        self.runned = True
+        if process.returncode != 0:
+            print("Error al ejecutar test: ", self.test_name)
+            print(stdout)
+            self.error = True
+            self.failed = True
+            return
+        self.parse_output(bytes.decode(stdout), wall)
+
+    def parse_output(self, output: str, wall: float) -> None:
+        """Extrae la salida de la TTY, los ticks y los Hz de la salida de
+        Logisim y reparte el tiempo `wall` entre arranque/carga y simulacion."""
+        r = output.find("halted due to halt pin")
+        self.result = output[:r].strip()
+        s = output.find("Hz (")
+        e = output.find(" ticks", s)
+        self.speed = int(output[s + 4 : e])
+        try:
+            hz = output[: s - 1].split()[-1]
+            self.hz = float(hz.replace(",", "."))
+        except (IndexError, ValueError):
+            self.hz = None
+
+        # Logisim solo reporta la frecuencia, el resto del tiempo es el
+        # arranque de la JVM y la carga del circuito
+        if self.hz:
+            self.simulate_time = min(wall, self.speed / self.hz)
+        else:
+            self.simulate_time = wall
+        self.startup_time = wall - self.simulate_time
+
+        self.failed = self.result != self.expected_result or (
+            self.expected_speed != None and self.speed > self.expected_speed
+        )
+
+    @property
+    def wall_time(self) -> float:
+        return self.assemble_time + self.startup_time + self.simulate_time
+
+    def status(self) -> str:
+        if self.error:
+            return "error"
+        if not self.runned:
+            return "skipped"
+        return "failed" if self.failed else "passed"
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.test_name,
+            "result": self.status(),
+            "expected": self.expected_result,
+            "obtained": self.result,
+            "ticks": self.speed,
+            "limit": self.expected_speed,
+            "hz": self.hz,
+            "time": {
+                "assemble": self.assemble_time,
+                "startup": self.startup_time,
+                "simulate": self.simulate_time,
+                "total": self.wall_time,
+            },
+        }
+
+    def regressed(self, baseline_speed: int | None, threshold: float) -> bool:
+        """Indica si los ticks superan la linea base en mas de `threshold` %."""
+        if baseline_speed is None or self.speed is None:
+            return False
+        return self.speed > baseline_speed * (1 + threshold / 100.0)
+
     def print(self) -> None:
         if self.error:
             print("El test no pudo ejecutarse correctamente")
@@ -136,24 +246,43 @@ class TestSuite:
         self.python = python
         self.failed: bool = False
 
-    def setup(self, fn:str|None = None):
+    def setup(
+        self,
+        fn: str | None = None,
+        names: set[str] | None = None,
+        compile: bool = True,
+    ):
         for file, path in self.searchAsmFiles():
             if fn is not None and file != fn:
                 continue
+            if names is not None and file not in names:
+                continue
+            self.test.append(self.load_test(file, path, compile))
+
+    def load_test(self, file: str, path: str, compile: bool = True) -> TestCase:
+        """Ensambla el .asm y crea el caso de prueba con lo que espera."""
+        start = time.perf_counter()
+        if compile:
             self.compile(file, path)
-            expected = self.extractExpectedResult(path)
-            excepted_time = self.extractExpectedSpeed(path)
-            self.test.append(
-                TestCase(
-                    file,
-                    os.path.join(self.base_dir, file, "Bank"),
-                    expected,
-                    excepted_time,
-                )
-            )
+        assemble_time = time.perf_counter() - start
+        expected = self.extractExpectedResult(path)
+        excepted_time = self.extractExpectedSpeed(path)
+        test = TestCase(
+            file,
+            os.path.join(self.base_dir, file, "Bank"),
+            expected,
+            excepted_time,
+        )
+        test.assemble_time = assemble_time
+        test.source = path
+        test.elements = self.extractElements(path)
+        return test
 
     def searchAsmFiles(self):
-        for root, _, files in os.walk(self.path):
+        for root, dirs, files in os.walk(self.path):
+            # Las carpetas include tienen modulos compartidos, no tests
+            if "include" in dirs:
+                dirs.remove("include")
             print_verbose(verbose_level_all, "Buscando archivos .asm en: ", root)
             for file in files:
                 try:
@@ -164,6 +293,93 @@ class TestSuite:
                 except Exception as e:
                     print("e")
 
+    def shard(self, index: int, count: int, history: dict[str, dict]) -> set[str]:
+        """Reparte los tests en `count` grupos de duracion similar (LPT) y
+        devuelve los nombres del grupo `index` (empezando en 1).
+
+        El peso de cada test es su duracion en ejecuciones anteriores; para
+        los tests sin historial se estima a partir del tamano del .asm."""
+        files = sorted(self.searchAsmFiles())
+        weights = self.estimate_durations(files, history)
+
+        shards: list[tuple[float, int]] = [(0.0, i) for i in range(count)]
+        assigned: dict[int, set[str]] = {i: set() for i in range(count)}
+        for file in sorted(weights, key=lambda f: (-weights[f], f)):
+            load, i = heapq.heappop(shards)
+            assigned[i].add(file)
+            heapq.heappush(shards, (load + weights[file], i))
+            print_verbose(verbose_level_all, "Shard", i + 1, "<-", file, weights[file])
+        return assigned[index - 1]
+
+    def estimate_durations(
+        self, files: list[tuple[str, str]], history: dict[str, dict]
+    ) -> dict[str, float]:
+        """Duracion de cada test en ejecuciones anteriores; para los tests sin
+        historial se estima a partir del tamano del .asm."""
+        sizes = {file: os.path.getsize(path) for file, path in files}
+        known = {
+            file: history[file]["duration"]
+            for file, _ in files
+            if file in history and history[file].get("duration")
+        }
+        if known:
+            per_byte = sum(known.values()) / max(1, sum(sizes[f] for f in known))
+        else:
+            per_byte = 1.0
+        return {file: known.get(file, sizes[file] * per_byte) for file, _ in files}
+
+    def coverage(self, path: str) -> set[str]:
+        """Caracteristicas del procesador que ejercita el test segun el
+        simulador de referencia; si no termina, las instrucciones que aparecen
+        en el programa ensamblado."""
+        try:
+            program = simulator.load_program(path)
+        except assembler.AssemblerError as e:
+            print("Error al compilar: ", path, e)
+            return set()
+        try:
+            return simulator.coverage(program)
+        except simulator.SimulatorError:
+            return simulator.static_coverage(program)
+
+    def smoke(self, history: dict[str, dict]) -> set[str]:
+        """Subconjunto de tests que cubre todo lo que cubre la suite (pares
+        opcode/funct, saltos tomados y no tomados y usos de hi/lo) con la
+        menor duracion posible.
+
+        Es un set cover greedy pesado: se elige el test con mas
+        caracteristicas nuevas por segundo hasta cubrirlas todas, y luego se
+        quitan, empezando por los mas lentos, los que quedaron redundantes."""
+        files = sorted(self.searchAsmFiles())
+        weights = self.estimate_durations(files, history)
+        covers = {file: self.coverage(path) for file, path in files}
+        missing = set().union(*covers.values())
+        total = len(missing)
+
+        selected: list[str] = []
+        while missing:
+            file = min(
+                (f for f in covers if covers[f] & missing),
+                key=lambda f: (-len(covers[f] & missing) / max(weights[f], 1e-9), f),
+            )
+            selected.append(file)
+            missing -= covers[file]
+        for file in sorted(selected, key=lambda f: (-weights[f], f)):
+            rest = set().union(*(covers[f] for f in selected if f != file))
+            if covers[file] <= rest:
+                selected.remove(file)
+
+        print(
+            "Smoke: {} de {} tests, {} caracteristicas cubiertas, {:.0%} del tiempo estimado de la suite".format(
+                len(selected),
+                len(files),
+                total,
+                sum(weights[f] for f in selected) / max(sum(weights.values()), 1e-9),
+            )
+        )
+        print_verbose(verbose_level_test_basic_detail, "Tests: ", ", ".join(sorted(selected)))
+        return set(selected)
+
     def compile(self, file: str, path: str) -> None:
         base_dir = os.path.join(self.base_dir, file)
         print_verbose(verbose_level_all, "Creando directorio: ", base_dir)
@@ -172,10 +388,29 @@ class TestSuite:
         except FileExistsError as e:
             print_verbose(verbose_level_all, "Directorio existente: ", base_dir)
         print_verbose(verbose_level_all, "Compilando: ", path)
-        status = os.system(f"{self.python} assembler.py {path} -o {base_dir}")
+        objects = os.path.join(self.base_dir, ".obj")
+        status = os.system(f"{self.python} assembler.py {path} -o {base_dir} -c {objects}")
         if status != 0:
             print("Error al compilar: ", path)
 
+    async def compile_async(self, test: TestCase) -> None:
+        base_dir = os.path.join(self.base_dir, test.test_name)
+        os.makedirs(base_dir, exist_ok=True)
+        print_verbose(verbose_level_all, "Compilando: ", test.source)
+        start = time.perf_counter()
+        process = await asyncio.create_subprocess_exec(
+            *shlex.split(self.python),
+            "assembler.py",
+            test.source,
+            "-o",
+            base_dir,
+            "-c",
+            os.path.join(self.base_dir, ".obj"),
+        )
+        if await process.wait() != 0:
+            print("Error al compilar: ", test.source)
+        test.assemble_time = time.perf_counter() - start
+
     def extractExpectedResult(self, path: str) -> str | None:
         with open(path, "r") as file:
             content = file.readlines()
@@ -208,11 +443,250 @@ class TestSuite:
         print_verbose(verbose_level_all, expected)
         return expected
 
-    def run_all(self) -> None:
+    def extractElements(self, path: str) -> int | None:
+        with open(path, "r") as file:
+            for line in file:
+                if line.startswith("#elements"):
+                    return int(line[10:].strip())
+        return None
+
+    def run_async(self, jobs: int, fail_fast: bool = False, assemble: bool = True) -> None:
+        """Ensambla y ejecuta los tests con hasta `jobs` procesos de Logisim
+        a la vez. El ensamblado de los siguientes tests se adelanta mientras
+        se simulan los actuales. Con `assemble=False` se usan los Bank que ya
+        estan en la carpeta de salida."""
+        asyncio.run(self._run_pipeline(jobs, fail_fast, assemble))
+
+    async def _run_pipeline(self, jobs: int, fail_fast: bool, assemble: bool) -> None:
+        assembling = asyncio.Semaphore(jobs)
+        simulating = asyncio.Semaphore(jobs)
+        status = LiveStatus(len(self.test))
+        stop = asyncio.Event()
+
+        async def pipeline(test: TestCase) -> None:
+            if assemble:
+                async with assembling:
+                    if stop.is_set():
+                        return
+                    await self.compile_async(test)
+            async with simulating:
+                if stop.is_set():
+                    return
+                status.start(test)
+                await test.run_async(self.logisim, self.circ, self.template)
+            self.failed |= test.failed
+            status.finish(test)
+            if fail_fast and test.failed and not stop.is_set():
+                stop.set()
+                status.clear()
+                print("Deteniendo la ejecucion tras el primer fallo (--fail-fast)")
+
+        ticker = asyncio.create_task(status.refresh_forever())
+        try:
+            await asyncio.gather(*(pipeline(test) for test in self.test))
+        finally:
+            ticker.cancel()
+            status.clear()
+
+    def schedule(self, policy: str, history: dict[str, dict]) -> None:
+        """Ordena los tests segun la politica indicada:
+
+        - default: el orden en que se encontraron los .asm
+        - failed-first: primero los que fallaron la ultima vez y los nuevos
+        - fastest: de menor a mayor duracion en ejecuciones anteriores
+        """
+        if policy == "failed-first":
+            self.test.sort(
+                key=lambda t: 0
+                if t.test_name not in history or history[t.test_name].get("failed")
+                else 1
+            )
+        elif policy == "fastest":
+            self.test.sort(
+                key=lambda t: history.get(t.test_name, {}).get("duration", 0.0)
+            )
+        elif policy != "default":
+            raise ValueError("Politica de orden desconocida: {}".format(policy))
+        print_verbose(
+            verbose_level_all, "Orden de ejecucion: ", [t.test_name for t in self.test]
+        )
+
+    def run_all(self, fail_fast: bool = False) -> None:
         for test in self.test:
             test.run(self.logisim, self.circ, self.template)
             self.failed |= test.failed
             test.print()
+            if fail_fast and test.failed:
+                print("Deteniendo la ejecucion tras el primer fallo (--fail-fast)")
+                break
+
+    def watch(
+        self, interval: float, history_file: str, jobs: int = 0, check: bool = True
+    ) -> None:
+        """Se queda esperando cambios (por mtime) en los .asm y en los .circ.
+
+        Un .asm modificado se vuelve a ensamblar y solo se ejecuta ese test;
+        un cambio en el circuito o en sus librerias ejecuta toda la suite con
+        los que fallaron primero, despues de validarlo con `preflight` si
+        `check` es True. Mientras el circuito tenga errores no se ejecuta
+        ningun test. Con `jobs` > 0 las simulaciones van en paralelo como en
+        `run_async`. Los tests ya ensamblados se mantienen en memoria entre
+        iteraciones."""
+        sources = dict(self.searchAsmFiles())
+        tests = {name: self.load_test(name, path) for name, path in sources.items()}
+        asm_mtimes = {path: os.path.getmtime(path) for path in sources.values()}
+        circ_mtimes = self.circuit_mtimes()
+        include_mtimes = self.include_mtimes()
+        history = load_history(history_file)
+        broken = False
+
+        def run(selected: list[TestCase]) -> None:
+            self.test = selected
+            self.failed = False
+            if jobs > 0:
+                self.run_async(jobs, assemble=False)
+            else:
+                self.run_all()
+            save_history(history_file, build_report(self)["tests"])
+            history.update(load_history(history_file))
+            print(
+                "Esperando cambios... ({} de {} tests fallaron)".format(
+                    sum(t.failed for t in tests.values()), len(tests)
+                )
+            )
+
+        self.test = list(tests.values())
+        self.schedule("failed-first", history)
+        run(self.test)
+
+        try:
+            while True:
+                time.sleep(interval)
+                changed: list[TestCase] = []
+                current = dict(self.searchAsmFiles())
+                for name in set(sources) - set(current):
+                    print_verbose(verbose_level_test_basic_detail, "Test eliminado: ", name)
+                    asm_mtimes.pop(sources[name], None)
+                    tests.pop(name, None)
+                for name, path in current.items():
+                    try:
+                        mtime = os.path.getmtime(path)
+                    except OSError:
+                        continue
+                    if asm_mtimes.get(path) != mtime:
+                        asm_mtimes[path] = mtime
+                        print("Cambio detectado en: ", path)
+                        tests[name] = self.load_test(name, path)
+                        changed.append(tests[name])
+                sources = current
+
+                mtimes = self.include_mtimes()
+                if mtimes != include_mtimes:
+                    # Un modulo compartido puede estar incluido en cualquier test
+                    include_mtimes = mtimes
+                    print("Cambio detectado en los modulos de include")
+                    for name, path in sources.items():
+                        tests[name] = self.load_test(name, path)
+                    changed = list(tests.values())
+
+                mtimes = self.circuit_mtimes()
+                if mtimes != circ_mtimes:
+                    print(
+                        "Cambio detectado en: ",
+                        ", ".join(
+                            sorted(
+                                f for f in set(mtimes) | set(circ_mtimes)
+                                if mtimes.get(f) != circ_mtimes.get(f)
+                            )
+                        ),
+                    )
+                    circ_mtimes = mtimes
+                    problems = preflight(self.circ, self.template) if check else []
+                    broken = bool(problems)
+                    if broken:
+                        print("El circuito no se puede cargar correctamente:")
+                        for problem in problems:
+                            print("  " + problem)
+                        print("Esperando cambios...")
+                        continue
+                    self.test = list(tests.values())
+                    self.schedule("failed-first", history)
+                    run(self.test)
+                elif changed and broken:
+                    print("El circuito tiene errores, esperando a que se corrija...")
+                elif changed:
+                    run(changed)
+        except KeyboardInterrupt:
+            print("Fin del modo watch")
+        self.test = list(tests.values())
+
+    def include_mtimes(self) -> dict[str, float]:
+        """mtime de los modulos compartidos en las carpetas include."""
+        mtimes = {}
+        for file in glob.glob(
+            os.path.join(self.path, "**", "include", "**", "*.asm"), recursive=True
+        ):
+            try:
+                mtimes[file] = os.path.getmtime(file)
+            except OSError:
+                pass
+        return mtimes
+
+    def circuit_mtimes(self) -> dict[str, float]:
+        """mtime del circuito, del template y de las librerias .circ."""
+        files = [self.circ, self.template]
+        files.extend(
+            glob.glob(os.path.join(os.path.dirname(self.circ), "libraries", "*.circ"))
+        )
+        mtimes = {}
+        for file in files:
+            try:
+                mtimes[file] = os.path.getmtime(file)
+            except OSError:
+                pass
+        return mtimes
+
+    def compare_baseline(self, baseline: dict[str, int], threshold: float) -> bool:
+        """Compara los ticks obtenidos contra la linea base y reporta las
+        diferencias. Devuelve True si algun test empeora mas de `threshold` %."""
+        print("Comparacion de ticks contra la linea base (umbral {}%)".format(threshold))
+        regression = False
+        total_base = 0
+        total_now = 0
+        for test in self.test:
+            if test.speed is None:
+                continue
+            base = baseline.get(test.test_name)
+            if base is None:
+                print("  {:<20} {:>10} (sin linea base)".format(test.test_name, test.speed))
+                continue
+            total_base += base
+            total_now += test.speed
+            delta = test.speed - base
+            percent = 100.0 * delta / base if base else 0.0
+            mark = ""
+            if test.regressed(base, threshold):
+                mark = "  <== REGRESION"
+                regression = True
+            print(
+                "  {:<20} {:>10} -> {:>10} {:>+8} ({:+.2f}%){}".format(
+                    test.test_name, base, test.speed, delta, percent, mark
+                )
+            )
+        if total_base:
+            delta = total_now - total_base
+            percent = 100.0 * delta / total_base
+            print(
+                "  {:<20} {:>10} -> {:>10} {:>+8} ({:+.2f}%)".format(
+                    "TOTAL", total_base, total_now, delta, percent
+                )
+            )
+        if regression:
+            print("ERROR: hay tests que superan el umbral de regresion de ticks")
+        print(
+            "---------------------------------------------------------------------------------------"
+        )
+        return regression
 
     def run_test(self, test_name: str):
         self.setup(test_name)
@@ -224,6 +698,449 @@ class TestSuite:
                 return test
 
 
+class LiveStatus:
+    """Linea de estado que se reescribe en la terminal mientras corren los
+    tests: los que estan corriendo (con su tiempo), los OK/FAIL y los ticks."""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.running: dict[str, float] = {}
+        self.passed = 0
+        self.failed = 0
+        self.ticks = 0
+        self.start_time = time.perf_counter()
+        self.enabled = sys.stdout.isatty()
+
+    def start(self, test: TestCase) -> None:
+        self.running[test.test_name] = time.perf_counter()
+        self.refresh()
+
+    def finish(self, test: TestCase) -> None:
+        self.running.pop(test.test_name, None)
+        if test.failed:
+            self.failed += 1
+        else:
+            self.passed += 1
+        self.ticks += test.speed or 0
+        self.clear()
+        test.print()
+        self.refresh()
+
+    def line(self) -> str:
+        now = time.perf_counter()
+        running = ", ".join(
+            "{} {:.1f}s".format(name, now - start)
+            for name, start in self.running.items()
+        )
+        return "[{:.1f}s] {}/{} OK: {} FAIL: {} ticks: {} | corriendo: {}".format(
+            now - self.start_time,
+            self.passed + self.failed,
+            self.total,
+            self.passed,
+            self.failed,
+            self.ticks,
+            running or "-",
+        )
+
+    def refresh(self) -> None:
+        if self.enabled:
+            sys.stdout.write("\r\033[K" + self.line())
+            sys.stdout.flush()
+
+    def clear(self) -> None:
+        if self.enabled:
+            sys.stdout.write("\r\033[K")
+            sys.stdout.flush()
+
+    async def refresh_forever(self, period: float = 0.2) -> None:
+        while True:
+            self.refresh()
+            await asyncio.sleep(period)
+
+
+def build_report(suite: TestSuite) -> dict:
+    """Resume el resultado de la suite y los tiempos por fase de cada test."""
+    report = {
+        "circuit": suite.circ,
+        "failed": suite.failed,
+        "tests": [test.to_dict() for test in suite.test],
+    }
+    report["time"] = sum_phase_times(report["tests"])
+    return report
+
+
+def sum_phase_times(tests: list[dict]) -> dict[str, float]:
+    return {
+        phase: sum(test["time"][phase] for test in tests)
+        for phase in ("assemble", "startup", "simulate", "total")
+    }
+
+
+def write_json_report(path: str, report: dict) -> None:
+    """Escribe el reporte de la suite en JSON."""
+    with open(path, "w") as file:
+        json.dump(report, file, indent=4)
+        file.write("\n")
+
+
+def write_junit_report(path: str, report: dict) -> None:
+    """Escribe el reporte de la suite en formato JUnit-XML."""
+    tests = report["tests"]
+    classname = os.path.basename(report["circuit"])
+    root = ET.Element(
+        "testsuite",
+        name=classname,
+        tests=str(len(tests)),
+        failures=str(sum(t["result"] == "failed" for t in tests)),
+        errors=str(sum(t["result"] == "error" for t in tests)),
+        skipped=str(sum(t["result"] == "skipped" for t in tests)),
+        time="%.3f" % report["time"]["total"],
+    )
+    for test in tests:
+        times = test["time"]
+        case = ET.SubElement(
+            root,
+            "testcase",
+            classname=classname,
+            name=test["name"],
+            time="%.3f" % times["total"],
+        )
+        properties = ET.SubElement(case, "properties")
+        for name, value in (
+            ("ticks", test["ticks"]),
+            ("limit", test["limit"]),
+            ("hz", test["hz"]),
+            ("assemble_time", "%.3f" % times["assemble"]),
+            ("startup_time", "%.3f" % times["startup"]),
+            ("simulate_time", "%.3f" % times["simulate"]),
+        ):
+            if value is not None:
+                ET.SubElement(properties, "property", name=name, value=str(value))
+        if test["result"] == "failed":
+            failure = ET.SubElement(
+                case,
+                "failure",
+                message="Expected: {} | Got: {} | Ticks: {} | Limit: {}".format(
+                    test["expected"], test["obtained"], test["ticks"], test["limit"]
+                ),
+            )
+            failure.text = "Esperado: {}\nObtenido: {}".format(
+                test["expected"], test["obtained"]
+            )
+        elif test["result"] == "error":
+            ET.SubElement(case, "error", message="El test no pudo ejecutarse")
+        elif test["result"] == "skipped":
+            ET.SubElement(case, "skipped")
+    ET.indent(root)
+    ET.ElementTree(root).write(path, encoding="utf-8", xml_declaration=True)
+
+
+def merge_reports(paths: list[str]) -> dict:
+    """Combina los reportes parciales de cada shard en uno solo."""
+    tests: dict[str, dict] = {}
+    circuit = ""
+    failed = False
+    for path in paths:
+        with open(path, "r") as file:
+            report = json.load(file)
+        circuit = circuit or report["circuit"]
+        failed |= report["failed"]
+        for test in report["tests"]:
+            if test["name"] in tests:
+                print("Test repetido en varios shards: ", test["name"])
+            tests[test["name"]] = test
+    report = {
+        "circuit": circuit,
+        "failed": failed,
+        "tests": [tests[name] for name in sorted(tests)],
+    }
+    report["time"] = sum_phase_times(report["tests"])
+    return report
+
+
+def print_benchmark(suite: TestSuite) -> None:
+    """Tabla de los kernels de rendimiento (`<kernel>-<tamaño>` con
+    #elements) agrupados por kernel y ordenados por tamaño, con los ticks por
+    elemento y la frecuencia de simulación de cada uno."""
+    kernels: dict[str, list[tuple[int, TestCase]]] = {}
+    for test in suite.test:
+        name, _, size = test.test_name.rpartition("-")
+        if test.elements is None or not size.isdigit():
+            continue
+        kernels.setdefault(name, []).append((int(size), test))
+
+    print(
+        "{:<10} {:>7} {:>10} {:>10} {:>11} {:>10}".format(
+            "Kernel", "Tamaño", "Elementos", "Ticks", "Ticks/elem", "Hz"
+        )
+    )
+    for name in sorted(kernels):
+        for size, test in sorted(kernels[name], key=lambda k: k[0]):
+            if test.speed is None:
+                print("{:<10} {:>7} {:>10} {:>10}".format(name, size, test.elements, "-"))
+                continue
+            print(
+                "{:<10} {:>7} {:>10} {:>10} {:>11.2f} {:>10} {}".format(
+                    name,
+                    size,
+                    test.elements,
+                    test.speed,
+                    test.speed / test.elements,
+                    "{:.0f}".format(test.hz) if test.hz else "-",
+                    "FAIL" if test.failed else "",
+                ).rstrip()
+            )
+
+
+def print_report_summary(report: dict) -> None:
+    tests = report["tests"]
+    for test in tests:
+        if test["result"] != "passed":
+            print("Resultado:", test["name"], " ===> ", test["result"].upper())
+    print(
+        "Tests: {} | OK: {} | FAIL: {} | Error: {} | Tiempo: {:.2f}s".format(
+            len(tests),
+            sum(t["result"] == "passed" for t in tests),
+            sum(t["result"] == "failed" for t in tests),
+            sum(t["result"] == "error" for t in tests),
+            report["time"]["total"],
+        )
+    )
+
+
+def load_history(path: str) -> dict[str, dict]:
+    """Lee el historial de ejecuciones anteriores ({test: {duration, failed}})."""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r") as file:
+            return json.load(file).get("tests", {})
+    except (ValueError, OSError):
+        return {}
+
+
+def save_history(path: str, tests: list[dict]) -> None:
+    """Actualiza el historial con los tests de un reporte."""
+    history = load_history(path)
+    for test in tests:
+        if test["result"] in ("passed", "failed"):
+            history[test["name"]] = {
+                "duration": test["time"]["total"],
+                "failed": test["result"] == "failed",
+            }
+    with open(path, "w") as file:
+        json.dump({"tests": dict(sorted(history.items()))}, file, indent=4)
+        file.write("\n")
+
+
+def load_baseline(path: str) -> dict[str, int]:
+    """Lee el fichero de linea base de ticks ({test: ticks}). Lanza
+    ValueError si no tiene esa forma."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as file:
+        try:
+            baseline = json.load(file)
+        except ValueError as e:
+            raise ValueError("La linea base {} no es un JSON valido: {}".format(path, e))
+    if not isinstance(baseline, dict) or not all(
+        isinstance(ticks, int) and not isinstance(ticks, bool) for ticks in baseline.values()
+    ):
+        raise ValueError(
+            "La linea base {} tiene que ser un objeto {{test: ticks}} con ticks enteros".format(path)
+        )
+    return baseline
+
+
+def save_baseline(path: str, suite: TestSuite) -> None:
+    """Actualiza la linea base con los ticks de los tests que pasaron; los
+    que fallaron no sirven de referencia."""
+    baseline = load_baseline(path)
+    for test in suite.test:
+        if test.speed is not None and test.status() == "passed":
+            baseline[test.test_name] = test.speed
+    with open(path, "w") as file:
+        json.dump(dict(sorted(baseline.items())), file, indent=4)
+        file.write("\n")
+    print_verbose(verbose_level_test_basic_detail, "Linea base actualizada: ", path)
+
+
+def load_efficiency(path: str) -> list[dict]:
+    """Lee el historial de variantes del diseño evaluadas con --efficiency."""
+    if not os.path.exists(path):
+        return []
+    with open(path, "r") as file:
+        return json.load(file).get("variants", [])
+
+
+def save_efficiency(path: str, variants: list[dict]) -> None:
+    with open(path, "w") as file:
+        json.dump({"variants": variants}, file, indent=4)
+        file.write("\n")
+
+
+def measure_efficiency(suite: TestSuite, variant: str, circuit_name: str) -> dict:
+    """Precio del circuito (price.bill), ticks totales de la suite y la figura
+    de mérito costo x ticks de la variante."""
+    cost = price.bill(suite.circ, circuit_name)[circuit_name]["price"]
+    ticks = sum(test.speed or 0 for test in suite.test)
+    return {
+        "variant": variant,
+        "circuit": suite.circ,
+        "cost": cost,
+        "ticks": ticks,
+        "merit": cost * ticks,
+        "failed": suite.failed,
+        "tests": sorted(test.test_name for test in suite.test),
+        "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
+def pareto_frontier(variants: list[dict]) -> list[dict]:
+    """Variantes correctas que ninguna otra supera a la vez en costo y ticks."""
+    candidates = [v for v in variants if not v["failed"]]
+    return [
+        v
+        for v in candidates
+        if not any(
+            o["cost"] <= v["cost"]
+            and o["ticks"] <= v["ticks"]
+            and (o["cost"], o["ticks"]) != (v["cost"], v["ticks"])
+            for o in candidates
+        )
+    ]
+
+
+def record_efficiency(path: str, current: dict) -> None:
+    """Guarda la variante en el historial (reemplazando la del mismo nombre) y
+    muestra las variantes medidas con los mismos tests, marcando con `*` la
+    frontera de Pareto."""
+    variants = [v for v in load_efficiency(path) if v["variant"] != current["variant"]]
+    variants.append(current)
+    save_efficiency(path, variants)
+
+    comparable = [v for v in variants if v["tests"] == current["tests"]]
+    frontier = pareto_frontier(comparable)
+    print(
+        "\n  {:<24} {:>10} {:>12} {:>16}".format("Variante", "Costo", "Ticks", "Costo x Ticks")
+    )
+    for v in sorted(comparable, key=lambda v: (v["cost"], v["ticks"])):
+        mark = "*" if v in frontier else ("x" if v["failed"] else " ")
+        print(
+            "{} {:<24} {:>10} {:>12} {:>16}".format(
+                mark, v["variant"], v["cost"], v["ticks"], v["merit"]
+            )
+        )
+    skipped = len(variants) - len(comparable)
+    if skipped:
+        print("({} variantes medidas con otros tests no se muestran)".format(skipped))
+
+
+def pin_signature(circuit: price.Circuit) -> Counter:
+    """Pines (etiqueta, direccion, ancho) y TTYs de un circuito: lo que usan
+    `-tty halt,tty` y la sustitucion del template para conectar el diseno."""
+    pins: Counter = Counter()
+    for comp in circuit.comps:
+        attrs = dict(comp.attrs)
+        if comp.lib == "0" and comp.name == "Pin":
+            direction = "salida" if attrs.get("output") == "true" else "entrada"
+            pins[(attrs.get("label", ""), direction, int(attrs.get("width", "1")))] += 1
+        elif comp.lib == "5" and comp.name == "TTY":
+            pins[("TTY", "tty", 7)] += 1
+    return pins
+
+
+def describe_pin(pin: tuple) -> str:
+    label, direction, width = pin
+    if direction == "tty":
+        return "el TTY"
+    return "el pin '{}' ({}, ancho {})".format(label, direction, width)
+
+
+def preflight(circ: str, template: str) -> list[str]:
+    """Valida el circuito sin lanzar Logisim y devuelve los errores: que
+    existan todas las librerias `file#` (recursivamente), que cada
+    subcircuito usado este definido en su archivo y que los circuitos del
+    template tengan los mismos pines y TTYs en el diseno."""
+    try:
+        document = price.parse_document(circ, keep_layout=True)
+        reference = price.parse_document(template, keep_layout=True)
+    except (OSError, ET.ParseError) as e:
+        return ["No se pudo leer el circuito: {}".format(e)]
+
+    errors = []
+    documents = {document.path: document}
+    pending = [document]
+    while pending:
+        doc = pending.pop()
+        where = os.path.relpath(doc.path)
+        base = os.path.dirname(doc.path)
+        declared = {name for name, _ in doc.libs}
+        libraries: dict[str, price.Document] = {}
+        for name, desc in doc.libs:
+            if not desc.startswith("file#"):
+                continue
+            path = os.path.normpath(os.path.join(base, desc[5:]))
+            if path not in documents:
+                if not os.path.exists(path):
+                    errors.append("{}: no existe la libreria {}".format(where, desc[5:]))
+                    continue
+                try:
+                    documents[path] = price.parse_document(path, keep_layout=True)
+                except ET.ParseError as e:
+                    errors.append("{}: no se pudo leer la libreria {}: {}".format(where, desc[5:], e))
+                    continue
+                pending.append(documents[path])
+            libraries[name] = documents[path]
+
+        for circuit in doc.circuits.values():
+            for comp in circuit.comps:
+                if price.is_default(comp):
+                    continue
+                if comp.lib is None:
+                    owner = doc
+                elif comp.lib in libraries:
+                    owner = libraries[comp.lib]
+                else:
+                    if comp.lib not in declared:
+                        errors.append(
+                            "{} ({}): {} en {} usa la libreria {} que no esta declarada".format(
+                                where, circuit.name, comp.name, comp.loc, comp.lib
+                            )
+                        )
+                    continue
+                if comp.name not in owner.circuits:
+                    errors.append(
+                        "{} ({}): el subcircuito {} en {} no existe en {}".format(
+                            where, circuit.name, comp.name, comp.loc, os.path.relpath(owner.path)
+                        )
+                    )
+
+    for name, expected in reference.circuits.items():
+        circuit = document.circuits.get(name)
+        if circuit is None:
+            errors.append("{}: falta el circuito {} del template".format(os.path.relpath(circ), name))
+            continue
+        pins = pin_signature(circuit)
+        expected_pins = pin_signature(expected)
+        for pin in sorted(expected_pins - pins):
+            errors.append("{} ({}): falta {} del template".format(os.path.relpath(circ), name, describe_pin(pin)))
+        for pin in sorted(pins - expected_pins):
+            errors.append("{} ({}): {} no esta en el template".format(os.path.relpath(circ), name, describe_pin(pin)))
+    return errors
+
+
+def parse_shard(spec: str) -> tuple[int, int] | None:
+    """Convierte `K/N` en (K, N); None si no tiene esa forma o K no esta
+    entre 1 y N."""
+    index, _, count = spec.partition("/")
+    try:
+        shard = (int(index), int(count))
+    except ValueError:
+        return None
+    return shard if 1 <= shard[0] <= shard[1] else None
+
+
 class LogisimTests(unittest.TestCase):
 
     def setUp(self):
@@ -233,6 +1150,12 @@ class LogisimTests(unittest.TestCase):
     def check(self, name:str):
         test = self.tests.run_test(name)
         self.assertFalse(test.failed, f"Expected: {test.expected_result} | Got: {test.result}")
+        if baseline_file is not None:
+            base = baseline.get(name)
+            self.assertFalse(
+                test.regressed(base, threshold),
+                f"Ticks: {test.speed} | Baseline: {base} (+{threshold}%)",
+            )
 
     def test_add(self):
         self.check('add')
@@ -321,6 +1244,26 @@ output_folder:str
 template:str
 python:str
 logisim:str
+baseline_file:str|None
+update_baseline:bool
+threshold:float
+json_report:str|None
+junit_report:str|None
+history_file:str
+shard:tuple[int, int]|None
+shard_spec:str|None
+order:str
+fail_fast:bool
+watch:bool
+interval:float
+jobs:int
+tests:set[str]|None
+efficiency_file:str|None
+variant:str
+price_circuit:str
+benchmark:bool
+smoke:bool
+skip_preflight:bool
 
 usage = "usage: %prog tests_dir circuit [options]"
 
@@ -365,20 +1308,196 @@ parser.add_option(
     default="python",
     help="The python program or path to compile tests",
 )
+parser.add_option(
+    "-b",
+    "--baseline",
+    dest="baseline",
+    type="string",
+    default=None,
+    help="JSON file with the ticks of each test to detect regressions",
+)
+parser.add_option(
+    "--update-baseline",
+    dest="update_baseline",
+    action="store_true",
+    default=False,
+    help="Store the ticks of this run in the baseline file",
+)
+parser.add_option(
+    "--threshold",
+    dest="threshold",
+    type="float",
+    default=5.0,
+    help="Percentage of extra ticks over the baseline considered a regression",
+)
+parser.add_option(
+    "--json",
+    dest="json_report",
+    type="string",
+    default=None,
+    help="Write a JSON report with the result and phase timings of each test",
+)
+parser.add_option(
+    "--junit",
+    dest="junit_report",
+    type="string",
+    default=None,
+    help="Write a JUnit-XML report of the suite",
+)
+parser.add_option(
+    "--history",
+    dest="history",
+    type="string",
+    default=None,
+    help="JSON file with the durations of previous runs (default: OUT/.test-history.json)",
+)
+parser.add_option(
+    "--shard",
+    dest="shard",
+    type="string",
+    default=None,
+    help="Run only the shard i/N of the tests, balanced by previous durations",
+)
+parser.add_option(
+    "--merge",
+    dest="merge",
+    action="store_true",
+    default=False,
+    help="Merge the JSON reports given as arguments into a single result",
+)
+parser.add_option(
+    "--order",
+    dest="order",
+    type="choice",
+    choices=["default", "failed-first", "fastest"],
+    default="default",
+    help="Order to run the tests: default, failed-first or fastest",
+)
+parser.add_option(
+    "--fail-fast",
+    dest="fail_fast",
+    action="store_true",
+    default=False,
+    help="Stop after the first failed test",
+)
+parser.add_option(
+    "-w",
+    "--watch",
+    dest="watch",
+    action="store_true",
+    default=False,
+    help="Keep running and rerun the tests affected by each change",
+)
+parser.add_option(
+    "--interval",
+    dest="interval",
+    type="float",
+    default=1.0,
+    help="Seconds between checks for changes in watch mode",
+)
+parser.add_option(
+    "--tests",
+    dest="tests",
+    type="string",
+    default=None,
+    help="Comma separated names of the tests to run (default: all)",
+)
+parser.add_option(
+    "--efficiency",
+    dest="efficiency",
+    type="string",
+    default=None,
+    help="Price the circuit, record cost and total ticks of this variant in the given history file and show the Pareto frontier",
+)
+parser.add_option(
+    "--variant",
+    dest="variant",
+    type="string",
+    default=None,
+    help="Name of the design variant for --efficiency (default: the circuit file name)",
+)
+parser.add_option(
+    "--price-circuit",
+    dest="price_circuit",
+    type="string",
+    default="S-MIPS",
+    help="Circuit priced by --efficiency",
+)
+parser.add_option(
+    "--skip-preflight",
+    dest="skip_preflight",
+    action="store_true",
+    default=False,
+    help="Do not check the libraries, subcircuits and pins of the circuit before running the tests",
+)
+parser.add_option(
+    "--smoke",
+    dest="smoke",
+    action="store_true",
+    default=False,
+    help="Run only the fastest subset of tests that keeps the instruction, branch and hi/lo coverage of the suite",
+)
+parser.add_option(
+    "--benchmark",
+    dest="benchmark",
+    action="store_true",
+    default=False,
+    help="Report ticks per element and simulation Hz of the kernels generated by benchmarks.py",
+)
+parser.add_option(
+    "-j",
+    "--jobs",
+    dest="jobs",
+    type="int",
+    default=0,
+    help="Run up to JOBS Logisim instances at once with the asyncio runner",
+)
 
 unit = False
+merge = False
 
 try:
     options, args = parser.parse_args()
-    if len(args) != 2:
+    merge = options.merge
+    if merge:
+        if not args:
+            raise ValueError()
+        input_dir = circ = ""
+    elif len(args) != 2:
         raise ValueError()
-    input_dir = args[0]
-    circ = args[1]
+    else:
+        input_dir = args[0]
+        circ = args[1]
     output_folder = options.output_folder
     template = options.template
     verbose_level = int(options.verbose)
     python = options.python
     logisim = options.logisim
+    baseline_file = options.baseline
+    update_baseline = options.update_baseline
+    threshold = options.threshold
+    json_report = options.json_report
+    junit_report = options.junit_report
+    history_file = options.history or os.path.join(output_folder, ".test-history.json")
+    if merge and options.history is None:
+        # Los shards escriben sus reportes en su OUT y leen de ahi el
+        # historial, asi que el merge lo guarda junto a los reportes
+        history_file = os.path.join(os.path.dirname(args[0]), ".test-history.json")
+    shard_spec = options.shard
+    order = options.order
+    fail_fast = options.fail_fast
+    watch = options.watch
+    interval = options.interval
+    jobs = options.jobs
+    tests = None
+    if options.tests is not None:
+        tests = {name.strip() for name in options.tests.split(",") if name.strip()}
+    efficiency_file = options.efficiency
+    variant = options.variant or os.path.basename(circ)
+    price_circuit = options.price_circuit
+    benchmark = options.benchmark
+    smoke = options.smoke
+    skip_preflight = options.skip_preflight
 except:
     input_dir = os.getenv('TESTS', '')
     circ = os.getenv('CIRC', '')
@@ -387,11 +1506,46 @@ except:
     verbose_level = int(os.getenv('VERBOSE', 0))
     python = os.getenv('PYTHON', '')
     logisim = os.getenv('LOGISIM', '')
+    baseline_file = os.getenv('BASELINE') or None
+    update_baseline = False
+    threshold = float(os.getenv('THRESHOLD', 5.0))
+    json_report = None
+    junit_report = None
+    history_file = os.path.join(output_folder, ".test-history.json")
+    shard_spec = None
+    order = "default"
+    fail_fast = False
+    watch = False
+    interval = 1.0
+    jobs = 0
+    tests = None
+    efficiency_file = None
+    variant = os.path.basename(circ)
+    price_circuit = "S-MIPS"
+    benchmark = False
+    smoke = False
+    skip_preflight = False
     unit = True
     if not input_dir or not circ:
         parser.error("Incorrect command line arguments")
         exit(1)
 
+shard = None
+if shard_spec is not None:
+    shard = parse_shard(shard_spec)
+    if shard is None:
+        parser.error("Invalid shard {}: expected K/N with 1 <= K <= N".format(shard_spec))
+
+if merge:
+    report = merge_reports(args)
+    print_report_summary(report)
+    save_history(history_file, report["tests"])
+    if json_report is not None:
+        write_json_report(json_report, report)
+    if junit_report is not None:
+        write_junit_report(junit_report, report)
+    exit(1 if report["failed"] else 0)
+
 try:
     os.mkdir(output_folder)
 except FileExistsError as e:
@@ -403,11 +1557,71 @@ if not os.path.exists(template):
 
 test_suite = TestSuite(input_dir, output_folder, circ, template, logisim, python)
 
+if not skip_preflight:
+    start = time.perf_counter()
+    problems = preflight(circ, template)
+    print_verbose(
+        verbose_level_test_basic_detail,
+        "Validacion del circuito: {:.3f}s".format(time.perf_counter() - start),
+    )
+    if problems:
+        print("El circuito no se puede cargar correctamente:")
+        for problem in problems:
+            print("  " + problem)
+        exit(1)
+
+baseline = {}
+if baseline_file is not None:
+    try:
+        baseline = load_baseline(baseline_file)
+    except ValueError as e:
+        print(e)
+        exit(1)
+
 if __name__ == '__main__':
     if unit == True:
         unittest.main()
+    elif watch:
+        test_suite.watch(interval, history_file, jobs, not skip_preflight)
     else:
-        test_suite.setup()
-        test_suite.run_all()
+        names = tests
+        history = load_history(history_file)
+        if shard is not None:
+            names = test_suite.shard(shard[0], shard[1], history)
+            if tests is not None:
+                names &= tests
+            if json_report is None:
+                json_report = os.path.join(
+                    output_folder, "report-shard-{}-of-{}.json".format(*shard)
+                )
+        if smoke:
+            selected = test_suite.smoke(history)
+            names = selected if names is None else names & selected
+        test_suite.setup(names=names, compile=jobs <= 0)
+        test_suite.schedule(order, history)
+        if jobs > 0:
+            test_suite.run_async(jobs, fail_fast)
+        else:
+            test_suite.run_all(fail_fast)
+        if baseline_file is not None:
+            if update_baseline:
+                save_baseline(baseline_file, test_suite)
+            elif test_suite.compare_baseline(baseline, threshold):
+                test_suite.failed = True
+        if efficiency_file is not None:
+            record_efficiency(
+                efficiency_file, measure_efficiency(test_suite, variant, price_circuit)
+            )
+        if benchmark:
+            print_benchmark(test_suite)
+        report = build_report(test_suite)
+        # Con shards el historial lo actualiza el paso de --merge, asi todos
+        # los nodos calculan la particion con el mismo historial
+        if shard is None:
+            save_history(history_file, report["tests"])
+        if json_report is not None:
+            write_json_report(json_report, report)
+        if junit_report is not None:
+            write_junit_report(junit_report, report)
         if test_suite.failed:
             exit(1)
@@ -0,0 +1,369 @@
+"""Trazas binarias de ejecución del S-MIPS.
+
+Una traza guarda, por cada instrucción ejecutada en el simulador de
+referencia, el pc, la palabra de la instrucción, el registro escrito y su
+valor, la dirección de memoria accedida y el carácter escrito en la TTY.
+Los registros tienen ancho fijo (RECORD) y se agrupan en bloques de
+`chunk_records`; dentro de un bloque el pc se guarda como diferencia con el
+anterior (casi siempre 1), partiendo del primer pc del bloque, así cada
+bloque se decodifica solo. Con compresión cada bloque va comprimido con
+zlib, y las diferencias repetidas se comprimen muy bien.
+
+Al final del archivo hay un índice con la posición de cada bloque y el rango
+de pcs y de palabras de memoria escritas en él, la tabla de etiquetas del
+programa (si se conoce) y un pie con dónde empieza todo eso. El lector
+mapea el archivo con mmap y solo descomprime los bloques cuyo rango puede
+contener lo que se busca.
+
+Uso:
+  python tracefile.py record programa.asm -o programa.trace [-z]
+  python tracefile.py info programa.trace
+  python tracefile.py write programa.trace 0x4000
+  python tracefile.py exec programa.trace etiqueta
+  python tracefile.py dump programa.trace [-s PASO] [-n CANTIDAD]
+"""
+
+import argparse
+import json
+import mmap
+import struct
+import zlib
+from collections import namedtuple
+
+import assembler
+import simulator
+
+MAGIC = b"SMTR"
+VERSION = 1
+
+# magia, versión, flags, registros por bloque
+HEADER = struct.Struct("<4sHHI")
+# diferencia de pc, instrucción, registro escrito, flags, carácter de la TTY,
+# valor escrito, dirección accedida
+RECORD = struct.Struct("<iIBBBxII")
+# posición, bytes guardados, registros, primer paso, primer pc, pc mínimo y
+# máximo, palabra escrita mínima y máxima
+INDEX = struct.Struct("<QIIQIIIII")
+# posición del índice, bloques, posición y largo de las etiquetas, magia
+FOOTER = struct.Struct("<QIQI4s")
+
+COMPRESSED = 1
+
+# Flags de cada registro
+READ = 1
+WRITE = 2
+TTY = 4
+
+NO_REGISTER = 0xFF
+NO_WRITES = (0xFFFFFFFF, 0)
+
+Step = namedtuple("Step", "step pc word reg value address flags tty")
+Chunk = namedtuple("Chunk", "offset size count first_step first_pc min_pc max_pc min_write max_write")
+
+
+class TraceError(Exception):
+    pass
+
+
+class TraceWriter:
+    """Escribe una traza de a un bloque por vez: en memoria solo está el
+    bloque actual y el índice."""
+
+    def __init__(self, path, compress=False, chunk_records=4096):
+        self.file = open(path, "wb")
+        self.compress = compress
+        self.chunk_records = chunk_records
+        self.file.write(HEADER.pack(MAGIC, VERSION, COMPRESSED if compress else 0, chunk_records))
+        self.index = []
+        self.steps = 0
+        self.symbols = {}
+        self.start_chunk()
+
+    def start_chunk(self):
+        self.buffer = bytearray()
+        self.count = 0
+        self.first_pc = self.last_pc = None
+        self.min_pc, self.max_pc = 0xFFFFFFFF, 0
+        self.min_write, self.max_write = NO_WRITES
+
+    def record(self, pc, word, reg=None, value=0, address=None, write=False, tty=None):
+        """Agrega la instrucción ejecutada en `pc`. `address` es la dirección
+        en bytes del acceso a memoria y `write` si fue una escritura."""
+        if self.first_pc is None:
+            self.first_pc = self.last_pc = pc
+        flags = 0
+        if address is not None:
+            flags |= WRITE if write else READ
+            if write:
+                self.min_write = min(self.min_write, address >> 2)
+                self.max_write = max(self.max_write, address >> 2)
+        if tty is not None:
+            flags |= TTY
+        self.buffer += RECORD.pack(
+            pc - self.last_pc,
+            word,
+            NO_REGISTER if reg is None else reg,
+            flags,
+            tty or 0,
+            value,
+            address or 0,
+        )
+        self.last_pc = pc
+        self.min_pc = min(self.min_pc, pc)
+        self.max_pc = max(self.max_pc, pc)
+        self.count += 1
+        if self.count == self.chunk_records:
+            self.flush()
+
+    def flush(self):
+        if not self.count:
+            return
+        data = zlib.compress(bytes(self.buffer)) if self.compress else bytes(self.buffer)
+        self.index.append(
+            Chunk(
+                self.file.tell(),
+                len(data),
+                self.count,
+                self.steps,
+                self.first_pc,
+                self.min_pc,
+                self.max_pc,
+                self.min_write,
+                self.max_write,
+            )
+        )
+        self.file.write(data)
+        self.steps += self.count
+        self.start_chunk()
+
+    def close(self):
+        self.flush()
+        index_offset = self.file.tell()
+        for chunk in self.index:
+            self.file.write(INDEX.pack(*chunk))
+        symbols = json.dumps(self.symbols, sort_keys=True).encode("utf-8")
+        symbols_offset = self.file.tell()
+        self.file.write(symbols)
+        self.file.write(
+            FOOTER.pack(index_offset, len(self.index), symbols_offset, len(symbols), MAGIC)
+        )
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TraceReader:
+    """Consultas sobre una traza mapeada en memoria. Solo se leen los
+    bloques cuyo índice puede contener la respuesta."""
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.file.close()
+            raise TraceError("%s is empty" % path)
+        magic, version, flags, self.chunk_records = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise TraceError("%s is not a trace file" % path)
+        self.compressed = bool(flags & COMPRESSED)
+        index_offset, chunks, symbols_offset, symbols_length, magic = FOOTER.unpack_from(
+            self.map, len(self.map) - FOOTER.size
+        )
+        if magic != MAGIC:
+            self.close()
+            raise TraceError("%s is truncated" % path)
+        self.index = [
+            Chunk(*INDEX.unpack_from(self.map, index_offset + i * INDEX.size))
+            for i in range(chunks)
+        ]
+        self.symbols = json.loads(self.map[symbols_offset : symbols_offset + symbols_length])
+
+    @property
+    def steps(self):
+        return sum(chunk.count for chunk in self.index)
+
+    def chunk(self, chunk):
+        """Registros de un bloque, con el pc ya reconstruido."""
+        data = self.map[chunk.offset : chunk.offset + chunk.size]
+        if self.compressed:
+            data = zlib.decompress(data)
+        pc = chunk.first_pc
+        for i, (delta, word, reg, flags, tty, value, address) in enumerate(RECORD.iter_unpack(data)):
+            pc += delta
+            yield Step(
+                chunk.first_step + i,
+                pc,
+                word,
+                None if reg == NO_REGISTER else reg,
+                value,
+                address if flags & (READ | WRITE) else None,
+                flags,
+                tty if flags & TTY else None,
+            )
+
+    def steps_from(self, start=0):
+        """Registros desde el paso `start`, saltando los bloques anteriores."""
+        for chunk in self.index:
+            if chunk.first_step + chunk.count <= start:
+                continue
+            for step in self.chunk(chunk):
+                if step.step >= start:
+                    yield step
+
+    def first_write(self, address):
+        """Primera escritura en la palabra que contiene `address` (en bytes),
+        o None."""
+        word = address >> 2
+        for chunk in self.index:
+            if not chunk.min_write <= word <= chunk.max_write:
+                continue
+            for step in self.chunk(chunk):
+                if step.flags & WRITE and step.address >> 2 == word:
+                    return step
+        return None
+
+    def executions(self, pc):
+        """Todas las ejecuciones de la instrucción `pc` (en instrucciones)."""
+        for chunk in self.index:
+            if not chunk.min_pc <= pc <= chunk.max_pc:
+                continue
+            for step in self.chunk(chunk):
+                if step.pc == pc:
+                    yield step
+
+    def resolve(self, target):
+        """pc de una etiqueta del programa o de un número (decimal o 0x)."""
+        if target in self.symbols:
+            return self.symbols[target]
+        try:
+            return int(target, 0)
+        except ValueError:
+            raise TraceError("unknown label %s" % target)
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def record(program, path, compress=False, chunk_records=4096, max_steps=10_000_000, seed=0):
+    """Ejecuta `program` (.asm o imagen `Bank`) en el simulador de referencia
+    y guarda su traza en `path`. Devuelve la máquina al terminar."""
+    symbols = {}
+    if program.endswith(".asm"):
+        instructions, _ = assembler.link(assembler.load_program(program), symbols)
+    else:
+        instructions = simulator.load_bank(program)
+    machine = simulator.Machine(instructions, seed)
+    with TraceWriter(path, compress, chunk_records) as writer:
+        writer.symbols = symbols
+        while not machine.halted:
+            if machine.steps >= max_steps:
+                raise simulator.SimulatorError(
+                    machine.pc, "no halt after %d instructions" % max_steps
+                )
+            pc = machine.pc
+            word = machine.memory.get(pc, 0)
+            printed = len(machine.output)
+            machine.step()
+            reg, value = machine.written or (None, 0)
+            address, write = machine.access or (None, False)
+            tty = ord(machine.output[-1]) if len(machine.output) > printed else None
+            writer.record(pc, word, reg, value, address, write, tty)
+    return machine
+
+
+def format_step(step, labels=None):
+    name = simulator.decode(step.word) or "?"
+    where = labels.get(step.pc, "") if labels else ""
+    parts = ["{:>10} {:>6} {:<10} {:08x} {:<6}".format(step.step, step.pc, where, step.word, name)]
+    if step.reg is not None:
+        parts.append("r{}={}".format(step.reg, step.value))
+    if step.address is not None:
+        parts.append("{}[{:#x}]".format("W" if step.flags & WRITE else "R", step.address))
+    if step.tty is not None:
+        parts.append("tty {!r}".format(chr(step.tty)))
+    return " ".join(parts).rstrip()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    recorder = commands.add_parser("record", help="Run a program and write its trace.")
+    recorder.add_argument("program", help=".asm file or Bank image to run.")
+    recorder.add_argument("-o", "--out", required=True, help="Trace file to write.")
+    recorder.add_argument(
+        "-z", "--compress", action="store_true", help="Compress each chunk with zlib."
+    )
+    recorder.add_argument(
+        "-c", "--chunk", type=int, default=4096, help="Records per chunk."
+    )
+    recorder.add_argument(
+        "-m", "--max-steps", type=int, default=10_000_000, help="Stop after this many instructions."
+    )
+
+    info = commands.add_parser("info", help="Summary of a trace file.")
+    info.add_argument("trace")
+
+    write = commands.add_parser("write", help="First write to a memory address.")
+    write.add_argument("trace")
+    write.add_argument("address", help="Byte address (decimal or 0x).")
+
+    execs = commands.add_parser("exec", help="All executions of a label or instruction number.")
+    execs.add_argument("trace")
+    execs.add_argument("target", help="Label of the program or instruction number.")
+
+    dump = commands.add_parser("dump", help="Print the records of a trace.")
+    dump.add_argument("trace")
+    dump.add_argument("-s", "--start", type=int, default=0, help="First step to print.")
+    dump.add_argument("-n", "--count", type=int, default=50, help="Steps to print.")
+
+    args = parser.parse_args()
+
+    try:
+        if args.command == "record":
+            machine = record(args.program, args.out, args.compress, args.chunk, args.max_steps)
+            print("{} instrucciones, salida: {}".format(machine.steps, machine.text()))
+            return
+        with TraceReader(args.trace) as reader:
+            labels = {pc: label for label, pc in sorted(reader.symbols.items())}
+            if args.command == "info":
+                print(
+                    "{} instrucciones en {} bloques de {} registros{}".format(
+                        reader.steps,
+                        len(reader.index),
+                        reader.chunk_records,
+                        ", comprimidos" if reader.compressed else "",
+                    )
+                )
+            elif args.command == "write":
+                step = reader.first_write(int(args.address, 0))
+                if step is None:
+                    print("No hay escrituras en {}".format(args.address))
+                else:
+                    print(format_step(step, labels))
+            elif args.command == "exec":
+                for step in reader.executions(reader.resolve(args.target)):
+                    print(format_step(step, labels))
+            elif args.command == "dump":
+                for step, _ in zip(reader.steps_from(args.start), range(args.count)):
+                    print(format_step(step, labels))
+    except (TraceError, simulator.SimulatorError, assembler.AssemblerError, OSError) as e:
+        print(e)
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()